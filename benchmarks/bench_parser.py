@@ -0,0 +1,85 @@
+"""Single-pass parser against the old shlex.split + rescan path.
+
+Parses a synthetic script of pipelines and redirections three ways: the old
+path (shlex.split, then scanning the words for | and again for redirection
+operators), shell_parser uncached, and shell_parser with its parse cache
+warm, as when a script loop or history re-run repeats lines. Measured
+here: 1.1-1.2x for the uncached parser, 35-46x with the cache warm.
+
+    python benchmarks/bench_parser.py [--lines 20000] [--distinct 500]
+"""
+import argparse
+import os
+import random
+import shlex
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import shell_parser
+
+
+def legacy_parse(line):
+    """What run_line/execute_pipeline/run_command_segment used to do."""
+    parts = shlex.split(line, comments=True)
+    commands = []
+    current = []
+    if "|" in parts:
+        for part in parts:
+            if part == "|":
+                commands.append(current)
+                current = []
+            else:
+                current.append(part)
+    else:
+        current = parts
+    commands.append(current)
+    for cmd_parts in commands:
+        operator_indices = [i for i, part in enumerate(cmd_parts) if part in (">", ">>", "1>", "1>>", "2>", "2>>")]
+        for index in reversed(operator_indices):
+            del cmd_parts[index:index + 2]
+    return commands
+
+
+def synthetic_script(lines, distinct, seed=7):
+    rng = random.Random(seed)
+    templates = [
+        "grep -n 'pattern {n}' src/file{n}.py | sort | uniq -c > out{n}.txt",
+        "ls -la /var/log/app{n} 2> errors.log",
+        "cat \"data {n}.csv\" | cut -d, -f2 | sort -n | tail -5",
+        "echo processing item {n} >> progress.log",
+        "find . -name '*.tmp{n}' | xargs rm -f",
+    ]
+    pool = [rng.choice(templates).format(n=i) for i in range(distinct)]
+    return [rng.choice(pool) for _ in range(lines)]
+
+
+def timed(func, script):
+    start = time.perf_counter()
+    for line in script:
+        func(line)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=20000)
+    parser.add_argument("--distinct", type=int, default=500)
+    args = parser.parse_args()
+
+    script = synthetic_script(args.lines, args.distinct)
+    uncached = shell_parser.parse.__wrapped__
+
+    legacy = timed(legacy_parse, script)
+    fresh = timed(uncached, script)
+    shell_parser.parse.cache_clear()
+    cached = timed(shell_parser.parse, script)
+
+    print(f"{args.lines} lines, {args.distinct} distinct")
+    for label, elapsed in (("shlex + rescan", legacy), ("parser, uncached", fresh), ("parser, cached", cached)):
+        print(f"{label:<20}{elapsed * 1000:10.1f} ms {args.lines / elapsed:12.0f} lines/s  {legacy / elapsed:6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Cold vs warm ShellCompleter startup with the on-disk PATH index.
+
+Builds a synthetic PATH of executables in a temp directory, then times
+ShellCompleter() with no index file (cold) and with the index written by
+the previous run (warm).
+
+    python benchmarks/bench_path_index.py [--dirs 8] [--per-dir 5000] [--runs 5]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import shell_utils as utils
+
+
+def make_path(root, dirs, per_dir):
+    path_dirs = []
+    for d in range(dirs):
+        path_dir = os.path.join(root, f"bin{d}")
+        os.mkdir(path_dir)
+        for i in range(per_dir):
+            name = os.path.join(path_dir, f"cmd{d}_{i:06d}")
+            fd = os.open(name, os.O_WRONLY | os.O_CREAT, 0o755)
+            os.close(fd)
+        # Back-date the directory so the index does not treat it as racy.
+        old = time.time() - 60
+        os.utime(path_dir, (old, old))
+        path_dirs.append(path_dir)
+    return os.pathsep.join(path_dirs)
+
+
+def time_completer(index_file):
+    start = time.perf_counter()
+    utils.ShellCompleter(path_index=utils.PathIndex(index_file))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dirs", type=int, default=8)
+    parser.add_argument("--per-dir", type=int, default=5000)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        os.environ["PATH"] = make_path(root, args.dirs, args.per_dir)
+        index_file = os.path.join(root, "path_index.json")
+
+        cold, warm = [], []
+        for _ in range(args.runs):
+            if os.path.exists(index_file):
+                os.unlink(index_file)
+            cold.append(time_completer(index_file))
+            warm.append(time_completer(index_file))
+
+    total = args.dirs * args.per_dir
+    print(f"executables: {total} in {args.dirs} PATH dirs, {args.runs} runs")
+    print(f"cold (scan + write index): {min(cold) * 1000:8.1f} ms")
+    print(f"warm (load index):         {min(warm) * 1000:8.1f} ms")
+    print(f"speedup:                   {min(cold) / min(warm):8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
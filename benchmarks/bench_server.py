@@ -0,0 +1,72 @@
+"""Cold start vs. the persistent server for one-off commands.
+
+Starts shell_server.py on a temporary socket and times the same command
+three ways: a fresh seashell.py -c, shell_client.py -c (a new interpreter
+plus one round trip), and the round trip alone from this process, which is
+what a client that is already running (or not written in Python) pays.
+
+    python benchmarks/bench_server.py [--runs N] [--command 'true']
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+import shell_client
+
+
+def timed(fn, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return samples[len(samples) // 2], samples[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=30)
+    parser.add_argument("--command", default="true")
+    args = parser.parse_args()
+
+    # Interpreters started here should use cached bytecode like a normal run.
+    env = dict(os.environ)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+
+    with tempfile.TemporaryDirectory() as root:
+        socket_path = os.path.join(root, "seashell.sock")
+        server = subprocess.Popen([sys.executable, os.path.join(REPO, "shell_server.py"),
+                                   "--socket", socket_path], stderr=subprocess.PIPE, env=env)
+        server.stderr.readline()  # "listening on ..." once it is ready
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        try:
+            cold = lambda: subprocess.run([sys.executable, os.path.join(REPO, "seashell.py"),
+                                           "-c", args.command], stdout=devnull, env=env, check=False)
+            client = lambda: subprocess.run([sys.executable, "-S", "-I", os.path.join(REPO, "shell_client.py"),
+                                             "--socket", socket_path, "-c", args.command],
+                                            stdout=devnull, env=env, check=False)
+            round_trip = lambda: shell_client.run(args.command, socket_path, (0, devnull, 2))
+
+            print(f"{'':<24}{'p50':>10}{'min':>10}   ({args.runs} runs of {args.command!r})")
+            baseline = None
+            for label, fn in (("cold seashell.py -c", cold),
+                              ("shell_client.py -c", client),
+                              ("round trip only", round_trip)):
+                p50, best = timed(fn, args.runs)
+                baseline = baseline or p50
+                print(f"{label:<24}{p50 * 1000:8.2f}ms{best * 1000:8.2f}ms   {baseline / p50:5.1f}x")
+        finally:
+            os.close(devnull)
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Spawn latency of each backend as the shell's heap grows.
+
+Times spawn_command() + wait() of /bin/true with the Popen and posix_spawn
+backends after growing the heap with ballast objects, which is what makes
+fork()-based spawning slower in a long-running shell.
+
+    python benchmarks/bench_spawn.py [--heap-mb 0,100,500] [--spawns 200]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import shell_utils as utils
+
+
+def grow_heap(ballast, megabytes):
+    # Many small objects, like a big Trie or history, rather than one buffer.
+    chunk = 64
+    while sum(len(b) for b in ballast) * chunk < megabytes * 2**20:
+        ballast.append([bytes(chunk) for _ in range(16384)])
+
+
+def time_spawns(backend, spawns, devnull):
+    utils.set_spawn_backend(backend)
+    samples = []
+    for _ in range(spawns):
+        start = time.perf_counter()
+        utils.spawn_command(["true"], None, devnull, devnull).wait()
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return samples[len(samples) // 2], samples[int(len(samples) * 0.95)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--heap-mb", default="0,100,500")
+    parser.add_argument("--spawns", type=int, default=200)
+    args = parser.parse_args()
+
+    backends = ["popen"]
+    if hasattr(os, "posix_spawn"):
+        backends.append("posix_spawn")
+
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    ballast = []
+    print(f"{'heap MB':>8}" + "".join(f"{b + ' p50/p95 (ms)':>28}" for b in backends))
+    for megabytes in (int(m) for m in args.heap_mb.split(",")):
+        grow_heap(ballast, megabytes)
+        row = f"{megabytes:>8}"
+        for backend in backends:
+            p50, p95 = time_spawns(backend, args.spawns, devnull)
+            row += f"{p50 * 1000:>19.3f} / {p95 * 1000:<6.3f}"
+        print(row)
+    os.close(devnull)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Memory and query latency of the radix-tree Trie against the original
+one-node-per-character Trie, on synthetic command names.
+
+    python benchmarks/bench_trie.py [--names 50000] [--repeat 20]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import shell_utils as utils
+
+
+class LegacyTrieNode:
+    def __init__(self):
+        self.children = {}
+        self.is_end_of_word = False
+
+
+class LegacyTrie:
+    """The Trie as it was before the radix-tree rewrite."""
+
+    def __init__(self):
+        self.root = LegacyTrieNode()
+
+    def insert(self, word):
+        node = self.root
+        for char in word:
+            if char not in node.children:
+                node.children[char] = LegacyTrieNode()
+            node = node.children[char]
+        node.is_end_of_word = True
+
+    def find_matches(self, prefix):
+        node = self.root
+        for char in prefix:
+            if char not in node.children:
+                return []
+            node = node.children[char]
+        results = []
+        self._dfs(node, prefix, results)
+        return results
+
+    def _dfs(self, node, current_prefix, results):
+        if node.is_end_of_word:
+            results.append(current_prefix)
+        for char in sorted(node.children.keys()):
+            self._dfs(node.children[char], current_prefix + char, results)
+
+
+STEMS = ["git", "python", "docker", "kube", "perl", "gcc", "x86_64-linux-gnu",
+         "llvm", "apt", "systemd", "pg", "mysql", "npm", "cargo", "go", "java"]
+
+
+def synthetic_names(count, seed=1234):
+    rng = random.Random(seed)
+    alphabet = "abcdefghijklmnopqrstuvwxyz0123456789-_."
+    names = set()
+    while len(names) < count:
+        stem = rng.choice(STEMS)
+        tail = "".join(rng.choice(alphabet) for _ in range(rng.randint(2, 14)))
+        names.add(f"{stem}-{tail}" if rng.random() < 0.7 else tail)
+    return sorted(names, key=lambda _: rng.random())
+
+
+def measure_build(trie_class, names):
+    tracemalloc.start()
+    start = time.perf_counter()
+    trie = trie_class()
+    for name in names:
+        trie.insert(name)
+    elapsed = time.perf_counter() - start
+    size, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return trie, elapsed, size
+
+
+def measure_query(trie, prefix, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        matches = trie.find_matches(prefix)
+        best = min(best, time.perf_counter() - start)
+    return best, len(matches)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--names", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    names = synthetic_names(args.names)
+    legacy, legacy_build, legacy_mem = measure_build(LegacyTrie, names)
+    radix, radix_build, radix_mem = measure_build(utils.Trie, names)
+
+    print(f"{args.names} names")
+    print(f"{'':32}{'legacy':>12}{'radix':>12}")
+    print(f"{'build (ms)':32}{legacy_build * 1000:12.1f}{radix_build * 1000:12.1f}")
+    print(f"{'memory (MB)':32}{legacy_mem / 2**20:12.1f}{radix_mem / 2**20:12.1f}")
+
+    for prefix in ["", "g", "git-", "python-a", "x86_64-linux-gnu-g", "zzz"]:
+        legacy_time, count = measure_query(legacy, prefix, args.repeat)
+        radix_time, radix_count = measure_query(radix, prefix, args.repeat)
+        assert count == radix_count, prefix
+        label = f"query {prefix!r} ({count})"
+        print(f"{label:32}{legacy_time * 1000:10.2f}ms{radix_time * 1000:10.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Start-up budget check: fails when import or start-up time regresses.
+
+Measures the cumulative import time of shell_utils (from python -X
+importtime) and the time from launching shell_2.py --fast-start on a pty
+to its first prompt, keeps the best of several runs, and exits with
+status 1 if either is over its budget:
+
+    python benchmarks/check_startup.py
+    python benchmarks/check_startup.py --import-budget-ms 20 --startup-budget-ms 40
+
+The default startup budget is the 30 ms goal for time to the first prompt.
+A bare interpreter takes about 15 ms of that, so importing shell_utils
+gets the other 15 ms. Bytecode caching is left on and one warm-up run is
+discarded, so the numbers are steady-state rather than first-compile times.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+from suite import REPO, startup_samples
+
+
+def import_time_us(module, env):
+    """Cumulative microseconds spent importing module, per -X importtime."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=REPO, env=env, capture_output=True, text=True, check=True)
+    for line in result.stderr.splitlines():
+        fields = line.split("|")
+        if len(fields) == 3 and fields[2].strip() == module:
+            return int(fields[1])
+    raise RuntimeError(f"{module} not found in -X importtime output")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--import-budget-ms", type=float, default=15.0,
+                        help="budget for importing shell_utils (default 15)")
+    parser.add_argument("--startup-budget-ms", type=float, default=30.0,
+                        help="budget for launch to first prompt with --fast-start (default 30)")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    import_time_us("shell_utils", env)
+    import_ms = min(import_time_us("shell_utils", env) for _ in range(args.runs)) / 1000
+
+    saved = os.environ.pop("PYTHONDONTWRITEBYTECODE", None)
+    try:
+        with tempfile.TemporaryDirectory() as root:
+            samples = startup_samples(root, args.runs + 1, ("--fast-start",))[1:]
+    finally:
+        if saved is not None:
+            os.environ["PYTHONDONTWRITEBYTECODE"] = saved
+    startup_ms = min(samples) * 1000
+
+    failed = False
+    for label, value, budget in (("import shell_utils", import_ms, args.import_budget_ms),
+                                 ("startup to prompt", startup_ms, args.startup_budget_ms)):
+        verdict = "ok" if value <= budget else "OVER BUDGET"
+        failed |= value > budget
+        print(f"{label:<20}{value:8.1f} ms  (budget {budget:.1f} ms)  {verdict}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
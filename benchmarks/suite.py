@@ -0,0 +1,301 @@
+"""Offline benchmark suite: startup, completion, globbing, spawn, pipeline and capture throughput.
+
+Everything runs against synthetic data in a temp directory, so results do
+not depend on the host's PATH or network. Results are written as JSON so
+two runs can be compared:
+
+    python benchmarks/suite.py --output before.json
+    python benchmarks/suite.py --output after.json --compare before.json
+
+--quick uses small sizes for a fast smoke run.
+"""
+import argparse
+import json
+import os
+import platform
+import pty
+import select
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+import shell_utils as utils
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return {
+        "p50": samples[len(samples) // 2],
+        "p95": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        "min": samples[0],
+    }
+
+
+def make_executables(path_dir, count, prefix="cmd"):
+    os.makedirs(path_dir, exist_ok=True)
+    for i in range(count):
+        fd = os.open(os.path.join(path_dir, f"{prefix}{i:06d}"), os.O_WRONLY | os.O_CREAT, 0o755)
+        os.close(fd)
+    old = time.time() - 60
+    os.utime(path_dir, (old, old))
+
+
+def startup_samples(root, runs, options=()):
+    """Seconds from launching shell_2.py on a pty to its first prompt."""
+    env = dict(os.environ, SEASHELL_PATH_INDEX=os.path.join(root, "startup_index.json"),
+               SEASHELL_HISTFILE=os.path.join(root, "startup_history"))
+    samples = []
+    for _ in range(runs):
+        master, slave = pty.openpty()
+        start = time.perf_counter()
+        proc = subprocess.Popen([sys.executable, os.path.join(REPO, "shell_2.py"), *options],
+                                stdin=slave, stdout=slave, stderr=slave, env=env, cwd=root)
+        os.close(slave)
+        output = b""
+        while b"$ " not in output:
+            ready, _, _ = select.select([master], [], [], 10)
+            if not ready:
+                raise RuntimeError("shell did not print a prompt")
+            output += os.read(master, 4096)
+        samples.append(time.perf_counter() - start)
+        os.write(master, b"exit\n")
+        proc.wait()
+        os.close(master)
+    return samples
+
+
+def bench_startup(root, runs):
+    return [{"name": "startup_to_prompt", "params": {"options": " ".join(options)}, "unit": "s",
+             **percentiles(startup_samples(root, runs, options))}
+            for options in ((), ("--fast-start",))]
+
+
+def bench_completion(root, sizes, repeat):
+    results = []
+    saved_path = os.environ.get("PATH", "")
+    for size in sizes:
+        path_dir = os.path.join(root, f"path{size}")
+        make_executables(path_dir, size)
+        os.environ["PATH"] = path_dir
+        index = utils.PathIndex(os.path.join(root, f"index{size}.json"))
+        completer = utils.ShellCompleter(path_index=index)
+        completer.wait_until_ready()
+        for prefix in ("", "cmd", "cmd00", "cmd0000"):
+            samples = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                matches = completer.find_completions(prefix, True)
+                samples.append(time.perf_counter() - start)
+            results.append({"name": "complete_command", "unit": "s",
+                            "params": {"executables": size, "prefix": prefix, "matches": len(matches)},
+                            **percentiles(samples)})
+    os.environ["PATH"] = saved_path
+
+    for size in sizes:
+        big_dir = os.path.join(root, f"dir{size}")
+        make_executables(big_dir, size, prefix="file")
+        completer = utils.ShellCompleter(path_index=utils.PathIndex(os.path.join(root, "dir_index.json")))
+        text = os.path.join(big_dir, "file000")
+        # The first TAB lists the directory; later ones hit the listing cache.
+        for label, count in (("first", 1), ("repeat", repeat)):
+            samples = []
+            for _ in range(count):
+                start = time.perf_counter()
+                matches = completer.find_completions(text, False)
+                samples.append(time.perf_counter() - start)
+            results.append({"name": "complete_path", "unit": "s",
+                            "params": {"entries": size, "tab": label, "matches": len(matches)},
+                            **percentiles(samples)})
+    results += bench_argument_completion(root, repeat)
+    return results
+
+
+def bench_argument_completion(root, repeat):
+    """First TAB after a command (runs its --help), later TABs, and the
+    first TAB of a new session, which reads the on-disk index."""
+    import shell_argcomplete
+    tool = os.path.join(root, "tool")
+    with open(tool, "w") as f:
+        f.write("#!/bin/sh\ncat <<'EOF'\nusage: tool [--verbose] <command>\n\n")
+        for i in range(200):
+            f.write(f"   sub{i:03d}    Does thing {i}\n   -o{i}, --option{i}    Option {i}\n")
+        f.write("EOF\n")
+    os.chmod(tool, 0o755)
+    os.environ["SEASHELL_HELP_COMMANDS"] = "tool"
+    cache_file = os.path.join(root, "arg_index.json")
+    resolve = lambda name: tool
+    results = []
+    for label, count, fresh in (("first", 1, True), ("repeat", repeat, False), ("new session", 1, True)):
+        samples = []
+        for _ in range(count):
+            start = time.perf_counter()
+            if fresh:
+                completer = shell_argcomplete.ArgumentCompleter(resolve, cache_file, spec_dirs=[])
+            matches = completer.complete(["tool"], "sub1")
+            samples.append(time.perf_counter() - start)
+        results.append({"name": "complete_argument", "unit": "s",
+                        "params": {"tab": label, "matches": len(matches)}, **percentiles(samples)})
+    del os.environ["SEASHELL_HELP_COMMANDS"]
+    return results
+
+
+def bench_glob(root, dirs, files_per_dir):
+    """**/*.tmp over a synthetic tree, on one thread and on the default
+    number, and a one-directory *.tmp after the listing is cached."""
+    import shell_glob
+    tree = os.path.join(root, "globtree")
+    for i in range(dirs):
+        directory = os.path.join(tree, f"d{i // 100}", f"e{i % 100}")
+        os.makedirs(directory)
+        for k in range(files_per_dir):
+            os.close(os.open(os.path.join(directory, f"f{k}.{'tmp' if k % 10 == 0 else 'c'}"),
+                             os.O_WRONLY | os.O_CREAT))
+    results = []
+    saved_cwd = os.getcwd()
+    saved_threads = shell_glob.WALK_THREADS
+    os.chdir(tree)
+    try:
+        for threads in sorted({1, saved_threads}):
+            shell_glob.WALK_THREADS = threads
+            start = time.perf_counter()
+            matches = shell_glob.glob("**/*.tmp")
+            elapsed = time.perf_counter() - start
+            results.append({"name": "glob_recursive", "unit": "s",
+                            "params": {"files": dirs * files_per_dir, "threads": threads,
+                                       "matches": len(matches)},
+                            "p50": elapsed, "p95": elapsed, "min": elapsed})
+        listings = utils.DirListingCache()
+        samples = []
+        for _ in range(20):
+            start = time.perf_counter()
+            matches = shell_glob.glob("d0/e0/*.tmp", listings)
+            samples.append(time.perf_counter() - start)
+        results.append({"name": "glob_directory", "unit": "s",
+                        "params": {"entries": files_per_dir, "matches": len(matches)},
+                        **percentiles(samples)})
+    finally:
+        shell_glob.WALK_THREADS = saved_threads
+        os.chdir(saved_cwd)
+    return results
+
+
+def bench_spawn(runs):
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    results = []
+    for backend in ("popen", "posix_spawn"):
+        if backend == "posix_spawn" and not hasattr(os, "posix_spawn"):
+            continue
+        utils.set_spawn_backend(backend)
+        samples = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            utils.spawn_command(["true"], devnull, devnull, devnull).wait()
+            samples.append(time.perf_counter() - start)
+        results.append({"name": "spawn", "unit": "s", "params": {"backend": backend}, **percentiles(samples)})
+    utils.set_spawn_backend("auto")
+
+    # The same command through run_command_segment runs the in-process builtin.
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        utils.run_command_segment(["true"], devnull, devnull, devnull).wait()
+        samples.append(time.perf_counter() - start)
+    results.append({"name": "spawn", "unit": "s", "params": {"backend": "builtin"}, **percentiles(samples)})
+    os.close(devnull)
+    return results
+
+
+def bench_pipeline(megabytes, stage_counts):
+    results = []
+    for stages in stage_counts:
+        parts = ["head", "-c", f"{megabytes}M", "/dev/zero"]
+        for _ in range(stages - 1):
+            parts += ["|", "cat"]
+        parts += [">", os.devnull]
+        start = time.perf_counter()
+        utils.execute_pipeline(parts)
+        elapsed = time.perf_counter() - start
+        results.append({"name": "pipeline_throughput", "unit": "MB/s",
+                        "params": {"stages": stages, "megabytes": megabytes},
+                        "value": megabytes / elapsed})
+    return results
+
+
+def bench_capture(megabytes):
+    """MB/s read back through a $(...) command substitution."""
+    start = time.perf_counter()
+    output = utils.capture_output(f"head -c {megabytes}M /dev/zero")
+    elapsed = time.perf_counter() - start
+    assert len(output) == megabytes << 20
+    return [{"name": "capture_throughput", "unit": "MB/s",
+             "params": {"megabytes": megabytes}, "value": megabytes / elapsed}]
+
+
+def headline(result):
+    return result["value"] if "value" in result else result["p50"]
+
+
+def result_key(result):
+    return result["name"] + json.dumps(result["params"], sort_keys=True)
+
+
+def print_results(results, baseline=None):
+    previous = {result_key(r): r for r in (baseline or [])}
+    for r in results:
+        params = " ".join(f"{k}={v!r}" for k, v in r["params"].items())
+        value = headline(r)
+        shown = f"{value * 1000:10.3f} ms" if r["unit"] == "s" else f"{value:10.1f} {r['unit']}"
+        line = f"{r['name']:<22}{params:<52}{shown}"
+        old = previous.get(result_key(r))
+        if old is not None and headline(old):
+            line += f"  ({(value / headline(old) - 1) * 100:+.1f}%)"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--quick", action="store_true", help="small sizes for a smoke run")
+    args = parser.parse_args()
+
+    if args.quick:
+        sizes, repeat, runs, megabytes, glob_dirs = [1000, 5000], 5, 3, 16, 200
+    else:
+        sizes, repeat, runs, megabytes, glob_dirs = [10000, 50000, 100000], 20, 10, 256, 4000
+
+    results = []
+    with tempfile.TemporaryDirectory() as root:
+        results += bench_startup(root, runs)
+        results += bench_completion(root, sizes, repeat)
+        results += bench_glob(root, glob_dirs, 50)
+    results += bench_spawn(runs * 20)
+    results += bench_pipeline(megabytes, [1, 2, 4, 8])
+    results += bench_capture(megabytes)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+    print_results(results, baseline)
+
+    if args.output:
+        report = {
+            "meta": {
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpus": os.cpu_count(),
+                "timestamp": time.time(),
+            },
+            "results": results,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,256 +1,7 @@
 import sys
 import os
-import subprocess
-import shlex
-import readline
-import random
-
-class ShellCompleter:
-    def __init__(self):
-        self.path_commands = self._get_all_path_commands()
-
-    def _get_all_path_commands(self):
-        commands = {"echo", "exit", "type", "pwd", "cd", "history"} 
-        paths = os.environ.get("PATH", "").split(os.pathsep)
-        for p in paths:
-            if os.path.isdir(p):
-                try:
-                    for filename in os.listdir(p):
-                        full = os.path.join(p, filename)
-                        if os.access(full, os.X_OK):
-                            commands.add(filename)
-                except OSError:
-                    continue
-        return sorted(list(commands))
-    def complete(self, text, state):
-        if state == 0:
-            
-            begidx = readline.get_begidx()
-            is_command = (begidx == 0)
-
-            self.matches = []
-
-            if is_command:
-                self.matches = [c + " " for c in self.path_commands if c.startswith(text)]
-            else:
-                dirname, partial = os.path.split(text)
-                search_dir = dirname if dirname else "."
-                
-                if os.path.isdir(search_dir):
-                    try:
-                        for filename in os.listdir(search_dir):
-                            if filename.startswith(partial):
-                                full_path = os.path.join(search_dir, filename)
-                                display_name = os.path.join(dirname, filename) if dirname else filename
-                                
-                                if os.path.isdir(full_path):
-                                    display_name += "/"
-                                else:
-                                    display_name += " " 
-                                self.matches.append(display_name)
-                    except OSError:
-                        pass
-            self.matches.sort()
-        try:
-            return self.matches[state]
-        except IndexError:
-            return None
-
-path_dirs = os.environ["PATH"].split(os.pathsep)
-
-def display_matches(_, matches, _longest_match_length):
-    print() 
-    print(" ".join(matches)) 
-    sys.stdout.write("$ " + readline.get_line_buffer())
-    sys.stdout.flush()
-
-def run_command_segment(parts, input_fd, output_fd, error_fd):   
-   
-        stdout_dest = output_fd
-        stderr_dest = error_fd
-            
-        should_close_stdout = False
-        should_close_stderr = False
-
-        operator_indices = [i for i, part in enumerate(parts) if part in (">", ">>", "1>","1>>", "2>", "2>>")]
-        for index in reversed(operator_indices):
-            operator = parts[index]
-            if index + 1 >= len(parts):
-                print("Syntax error: no file specified for redirection")
-                continue
-            filename = parts[index + 1]
-            mode = "w"
-            if ">>" in operator:
-                    mode = "a"
-            try:
-                f = open(filename, mode)
-            except IOError as e:
-                print(f"Error opening file {filename}: {e}")
-                continue
-
-            if operator in ("2>", "2>>"):
-                
-                if should_close_stderr:
-                    stderr_dest.close() 
-                stderr_dest = f
-                should_close_stderr = True
-            else:
-                if should_close_stdout:
-                    stdout_dest.close()
-                stdout_dest = f
-                should_close_stdout = True
-            del parts[index:index + 2]
-
-        
-        command = parts[0]
-        args = parts[1:]
-
-        safe_stdout = stdout_dest if stdout_dest else sys.stdout
-        safe_stderr = stderr_dest if stderr_dest else sys.stderr
-
-        
-        def write_to_output(text, dest):
-            if isinstance(dest, int):
-                with os.fdopen(dest, 'w') as f:
-                    f.write(str(text) + "\n")
-            else:
-                print(text, file=dest)
-
-        
-        if command == "exit":
-            sys.exit(0)
-
-        elif command == "echo":
-            write_to_output(" ".join(args), safe_stdout)
-            if should_close_stdout: stdout_dest.close()
-            return None
-        
-        elif command == "type":
-            output_buffer = [] 
-            target = args[0] if args else ""
-            target = args[0] if args else ""
-        
-            if target in ("type", "echo", "exit", "pwd", "cd", "history"):
-                output_buffer.append(f"{target} is a shell builtin")
-            else:
-                found = False
-                for d in path_dirs: 
-                    full_path = os.path.join(d, target) 
-                    if os.path.isfile(full_path) and os.access(full_path, os.X_OK): 
-                        output_buffer.append(f"{target} is {full_path}")
-                        found = True
-                        break
-                if not found:
-                    print(f"{target}: not found", file=safe_stderr)
-            
-            if output_buffer:
-                write_to_output("\n".join(output_buffer), safe_stdout)
-                
-            if should_close_stdout: stdout_dest.close()
-            return None
-
-
-        elif command == "pwd":
-            write_to_output(os.getcwd(), safe_stdout)
-            if should_close_stdout: stdout_dest.close()
-            return None
-        
-        elif command == "history":
-            if args:
-                history_length = len(args)
-                history_output = []
-                n = int(args[0])
-                total_history = readline.get_current_history_length()
-                start_index = max(1, total_history - n+ 1)
-                for i in range(start_index, total_history + 1):
-                    history_output.append(f"{i}  {readline.get_history_item(i)}")
-                write_to_output("\n".join(history_output), safe_stdout)
-                if should_close_stdout: stdout_dest.close()
-                return None
-
-
-            else:
-                history_length = readline.get_current_history_length()
-                history_output = []
-                for i in range(1, history_length + 1):
-                    history_output.append(f"{i}  {readline.get_history_item(i)}")
-                write_to_output("\n".join(history_output), safe_stdout)
-                if should_close_stdout: stdout_dest.close()
-                return None
-
-
-        elif command == "cd":
-            if len(parts) > 1:
-                path= os.path.expanduser(parts[1])
-                try:
-                    os.chdir(path)
-                except FileNotFoundError:
-                    print(f"cd: {parts[1]}: No such file or directory", file=stderr_dest)
-            else:
-                os.chdir(os.path.expanduser("~"))
-        else:
-            try:
-                proc = subprocess.Popen(
-                parts, 
-                stdin=input_fd, 
-                stdout=safe_stdout, 
-                stderr=safe_stderr
-            )
-                return proc
-        
-            except FileNotFoundError:
-                    print(f"{command}: command not found", file=stderr_dest)
-        if should_close_stdout:
-            stdout_dest.close()
-        if should_close_stderr:
-            stderr_dest.close()
-
-def execute_pipeline(parts):
-    commands = []
-    current_cmd = []
-    for part in parts:
-        if part == "|":
-            if current_cmd:
-                commands.append(current_cmd)
-            current_cmd = []
-        else:
-            current_cmd.append(part)
-    if current_cmd:
-        commands.append(current_cmd)
- 
-    next_stdin = None 
-    children = []
-    
-    for i, cmd_parts in enumerate(commands):
-        is_last = (i == len(commands) - 1)
-        
-        if is_last:
-            stdout_fd = sys.stdout 
-            next_read_fd = None
-        else:
-            r, w = os.pipe()
-            stdout_fd = w
-            next_read_fd = r
-       
-        proc = run_command_segment(cmd_parts, next_stdin, stdout_fd, sys.stderr)
-        
-       
-        if next_stdin is not None and isinstance(next_stdin, int):
-            os.close(next_stdin)
-
-        if not is_last:
-            if proc: 
-                os.close(stdout_fd) 
-            
-        if proc:
-            children.append(proc)
-            
-        
-        next_stdin = next_read_fd
-
-    for proc in children:
-        proc.wait()
-
+import shell_utils as utils
+import shell_stats
 
 def print_banner():
     banner = r"""
@@ -287,13 +38,38 @@ def print_banner():
         "Time to clam up and code.",
         "Resting Beach Face (Standard Output)."
     ]
+    import random
     print(banner)
     print(f"   {random.choice(puns)}")
     print("   Type 'exit' to wave goodbye.\n")
 
 def main():
- 
-    completer = ShellCompleter()
+    try:
+        mode, value, options = utils.parse_shell_args(sys.argv[1:])
+        utils.apply_shell_options(options)
+    except ValueError as e:
+        print(f"seashell.py: {e}", file=sys.stderr)
+        sys.exit(2)
+    if mode != "interactive":
+        sys.exit(utils.run_noninteractive(mode, value))
+    interactive()
+
+def interactive():
+    import readline
+    import shell_history
+
+    utils.enable_job_control()
+    history = shell_history.HistoryFile()
+    utils.command_history = history
+    # Arrow keys and Ctrl-R are readline's and only see these lines;
+    # history -s and -p search the whole file.
+    for line in history.tail(int(os.environ.get("SEASHELL_HISTSIZE", "1000"))):
+        readline.add_history(line)
+
+    completer = utils.ShellCompleter(background=True, lazy=utils.fast_start)
+    if os.environ.get("SEASHELL_WATCH_PATH"):
+        import shell_watch
+        shell_watch.PathWatcher(completer).start()
     readline.set_completer(completer.complete)
 
     if 'libedit' in readline.__doc__: 
@@ -307,35 +83,37 @@ def main():
     readline.parse_and_bind('"\x1b[B": history-search-forward')
 
     try:
-        readline.set_completion_display_matches_hook(display_matches)
+        readline.set_completion_display_matches_hook(completer.display_matches)
     except AttributeError:
         pass
 
-    print_banner()
+    if utils.show_banner:
+        print_banner()
 
     while True:
+        utils.jobs.notify(sys.stderr)
         try:
             command_input = input("$ ")
             
 
-        except (EOFError, KeyboardInterrupt):
+        except EOFError:
             print()
             break
+        except KeyboardInterrupt:
+            print()
+            continue
         
         if not command_input.strip():
             continue
-
-        parts = shlex.split(command_input)
-        if not parts:
+        command_input = utils.read_continuation(command_input)
+        if command_input is None:
             continue
 
-        
-        if "|" in parts:
-            execute_pipeline(parts)
-        else:
-            proc = run_command_segment(parts, None, sys.stdout, sys.stderr)
-            if proc:
-                proc.wait()
+        history.append(command_input)
+        try:
+            utils.run_line(command_input)
+        except KeyboardInterrupt:
+            print()
 
 if __name__ == "__main__":
-    main()
+    shell_stats.run_profiled(main)
@@ -1,10 +1,35 @@
 import sys
-import shlex
-import readline
+import os
 import shell_utils as utils
+import shell_stats
 
 def main():
-    completer = utils.ShellCompleter()
+    try:
+        mode, value, options = utils.parse_shell_args(sys.argv[1:])
+        utils.apply_shell_options(options)
+    except ValueError as e:
+        print(f"shell_2.py: {e}", file=sys.stderr)
+        sys.exit(2)
+    if mode != "interactive":
+        sys.exit(utils.run_noninteractive(mode, value))
+    interactive()
+
+def interactive():
+    import readline
+    import shell_history
+
+    utils.enable_job_control()
+    history = shell_history.HistoryFile()
+    utils.command_history = history
+    # Arrow keys and Ctrl-R are readline's and only see these lines;
+    # history -s and -p search the whole file.
+    for line in history.tail(int(os.environ.get("SEASHELL_HISTSIZE", "1000"))):
+        readline.add_history(line)
+
+    completer = utils.ShellCompleter(background=True, lazy=utils.fast_start)
+    if os.environ.get("SEASHELL_WATCH_PATH"):
+        import shell_watch
+        shell_watch.PathWatcher(completer).start()
     readline.set_completer(completer.complete)
 
     if 'libedit' in readline.__doc__: 
@@ -17,32 +42,36 @@ def main():
 
     
     try:
-        readline.set_completion_display_matches_hook(utils.display_matches)
+        readline.set_completion_display_matches_hook(completer.display_matches)
     except AttributeError:
         pass
 
-    utils.print_banner()
+    if utils.show_banner:
+        utils.print_banner()
 
     
     while True:
+        utils.jobs.notify(sys.stderr)
         try:
             command_input = input("$ ")
-        except (EOFError, KeyboardInterrupt):
+        except EOFError:
             print()
             break
+        except KeyboardInterrupt:
+            print()
+            continue
         
         if not command_input.strip():
             continue
+        command_input = utils.read_continuation(command_input)
+        if command_input is None:
+            continue
 
-        parts = shlex.split(command_input)
-        if not parts: continue
-
-        if "|" in parts:
-            utils.execute_pipeline(parts)
-        else:
-            proc = utils.run_command_segment(parts, None, sys.stdout, sys.stderr)
-            if proc:
-                proc.wait()
+        history.append(command_input)
+        try:
+            utils.run_line(command_input)
+        except KeyboardInterrupt:
+            print()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    shell_stats.run_profiled(main)
\ No newline at end of file
@@ -0,0 +1,199 @@
+"""Subcommand and flag completion for the arguments of known commands.
+
+Each command's index is a tree of {"subcommands": {name: index}, "flags":
+[...]} nodes. It comes from a spec file, NAME.json, in one of the spec
+directories (SEASHELL_COMPLETION_SPECS, a PATH-style list, then
+$XDG_CONFIG_HOME/seashell/completions, then the completions/ directory
+shipped next to this module), or else from parsing the output of
+`NAME --help` once. Help-derived indexes are cached on disk, keyed by the
+binary's real path and validated against its size and mtime, so --help
+runs at most once per installed version of a tool, not once per TAB.
+
+Only commands in HELP_COMMANDS (or SEASHELL_HELP_COMMANDS, a comma or
+space separated list; "*" allows every command) are run with --help:
+completing an argument must never run an arbitrary program.
+"""
+import os
+import re
+
+from shell_utils import read_json_cache, write_json_cache
+
+ARG_INDEX_VERSION = 1
+
+# How long a --help run may take before the command is indexed as empty.
+HELP_TIMEOUT = 2.0
+
+HELP_COMMANDS = (
+    "apt", "apt-get", "brew", "cargo", "conda", "docker", "gh", "git", "go",
+    "helm", "kubectl", "make", "npm", "pip", "pip3", "podman", "poetry",
+    "rustup", "systemctl", "terraform", "uv", "yarn",
+)
+
+# An indented word (with optional ", alias" forms) followed by a
+# description, as in the command lists of git, docker, kubectl or cargo.
+_SUBCOMMAND_LINE = re.compile(r"^ {1,8}([a-z][\w.-]*(?:, [a-z][\w.-]*)*) {2,}\S")
+_FLAG = re.compile(r"(?:^|[\s,\[|(])(--?[A-Za-z0-9][\w-]*)")
+
+
+def default_arg_index_file():
+    override = os.environ.get("SEASHELL_ARG_INDEX")
+    if override:
+        return override
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(cache_home, "seashell", "arg_index.json")
+
+
+def default_spec_dirs():
+    dirs = [d for d in os.environ.get("SEASHELL_COMPLETION_SPECS", "").split(os.pathsep) if d]
+    config_home = os.environ.get("XDG_CONFIG_HOME") or os.path.expanduser("~/.config")
+    dirs.append(os.path.join(config_home, "seashell", "completions"))
+    dirs.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "completions"))
+    return dirs
+
+
+def help_allowed(name):
+    configured = os.environ.get("SEASHELL_HELP_COMMANDS")
+    if configured is None:
+        return name in HELP_COMMANDS
+    allowed = configured.replace(",", " ").split()
+    return "*" in allowed or name in allowed
+
+
+def normalize_spec(spec):
+    """Fills in a spec node's defaults; subcommands may be given as a plain
+    list of names."""
+    if not isinstance(spec, dict):
+        return {"subcommands": {}, "flags": []}
+    subcommands = spec.get("subcommands") or {}
+    if isinstance(subcommands, list):
+        subcommands = dict.fromkeys(subcommands)
+    return {
+        "subcommands": {name: normalize_spec(child) for name, child in subcommands.items()},
+        "flags": sorted(set(spec.get("flags") or ())),
+    }
+
+
+def parse_help(text):
+    """Index built from --help output: subcommands from indented
+    "name  description" lines, flags from the option column of lines
+    starting with "-" and from usage lines."""
+    subcommands = {}
+    flags = set()
+    in_usage = False
+    for line in text.splitlines():
+        stripped = line.strip()
+        if not stripped:
+            in_usage = False
+            continue
+        if stripped.lower().startswith("usage:"):
+            in_usage = True
+        if in_usage:
+            flags.update(_FLAG.findall(stripped))
+            continue
+        if stripped.startswith("-"):
+            # Only the option column, not flags mentioned in the description.
+            column = re.split(r" {2,}|\t", stripped, 1)[0]
+            flags.update(_FLAG.findall(column))
+            continue
+        match = _SUBCOMMAND_LINE.match(line)
+        if match:
+            for name in match.group(1).split(", "):
+                subcommands[name] = {"subcommands": {}, "flags": []}
+    return {"subcommands": subcommands, "flags": sorted(flag.rstrip("-") for flag in flags)}
+
+
+def run_help(path):
+    import subprocess
+    env = dict(os.environ, LC_ALL="C", TERM="dumb", PAGER="cat", GIT_PAGER="cat", MANPAGER="cat")
+    try:
+        result = subprocess.run([path, "--help"], stdin=subprocess.DEVNULL,
+                                capture_output=True, timeout=HELP_TIMEOUT, env=env)
+    except (OSError, subprocess.SubprocessError):
+        return ""
+    output = result.stdout or result.stderr
+    return output.decode("utf-8", "replace")
+
+
+class ArgumentCompleter:
+    """Completes the words after a command name from that command's index.
+    resolve maps a command name to its executable's path."""
+
+    def __init__(self, resolve, cache_file=None, spec_dirs=None):
+        self.resolve = resolve
+        self.cache_file = cache_file or default_arg_index_file()
+        self.spec_dirs = default_spec_dirs() if spec_dirs is None else spec_dirs
+        self.binaries = {}
+        self.dirty = False
+        self.help_runs = 0
+        self._specs = {}
+        self._load()
+
+    def _load(self):
+        self.binaries = read_json_cache(self.cache_file, ARG_INDEX_VERSION).get("binaries", {})
+
+    def save(self):
+        if self.dirty and write_json_cache(self.cache_file, ARG_INDEX_VERSION, binaries=self.binaries):
+            self.dirty = False
+
+    def _spec(self, name):
+        if name not in self._specs:
+            self._specs[name] = None
+            for spec_dir in self.spec_dirs:
+                try:
+                    with open(os.path.join(spec_dir, name + ".json")) as f:
+                        import json
+                        self._specs[name] = normalize_spec(json.load(f))
+                    break
+                except (OSError, ValueError):
+                    continue
+        return self._specs[name]
+
+    def index(self, name):
+        """The index for command name, or None if there is none."""
+        if os.sep in name:
+            return None
+        spec = self._spec(name)
+        if spec is not None:
+            return spec
+        if not help_allowed(name):
+            return None
+        location = self.resolve(name)
+        if location is None:
+            return None
+        path = os.path.realpath(location)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        cached = self.binaries.get(path)
+        if cached and cached.get("size") == st.st_size and cached.get("mtime") == st.st_mtime_ns:
+            return cached["index"]
+
+        index = parse_help(run_help(path))
+        self.help_runs += 1
+        self.binaries[path] = {"size": st.st_size, "mtime": st.st_mtime_ns, "index": index}
+        self.dirty = True
+        self.save()
+        return index
+
+    def complete(self, words, text):
+        """Sorted completions for text, given the words before it (command
+        name first), or None when the index has nothing to offer and file
+        names should be completed instead."""
+        node = self.index(words[0])
+        if node is None:
+            return None
+        positional = False
+        for word in words[1:]:
+            if word.startswith("-"):
+                continue
+            child = node["subcommands"].get(word)
+            if child is None or positional:
+                positional = True
+            else:
+                node = child
+        if text.startswith("-"):
+            return [flag for flag in node["flags"] if flag.startswith(text)] or None
+        if positional:
+            return None
+        return sorted(name for name in node["subcommands"] if name.startswith(text)) or None
@@ -0,0 +1,174 @@
+#!/usr/bin/env -S python3 -S -I
+"""Thin client for shell_server.py.
+
+    ./shell_client.py -c 'command line'
+    ./shell_client.py --complete TEXT [--command | --before LINE]
+
+Sends the line with this process's cwd, environment and stdin, stdout and
+stderr to the server and exits with the status it reports. Ctrl-C is
+passed on to the running command. When no server is listening, the line
+runs in this process, as seashell.py -c would run it.
+
+The client exists to start faster than the shell, so it runs with -S -I
+(no site-packages, no environment-driven setup) and imports nothing
+beyond the interpreter's own start-up modules: posix rather than os,
+_socket rather than socket, and its own copy of the wire format (see
+shell_server.py) rather than shell_server itself. Run it directly, or as
+python3 -S -I shell_client.py.
+"""
+import sys
+import posix
+import _socket
+
+# Must match shell_server.HEADER: a 4-byte big-endian length.
+HEADER_SIZE = 4
+
+
+def default_socket_path():
+    # As shell_server.default_socket_path, which this can't import.
+    # posix.environ has bytes keys and values.
+    if posix.environ.get(b"SEASHELL_SOCKET"):
+        return posix.environ[b"SEASHELL_SOCKET"]
+    runtime_dir = posix.environ.get(b"XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return runtime_dir.rstrip(b"/") + b"/seashell.sock"
+    return f"/tmp/seashell-{posix.getuid()}.sock"
+
+
+def _encode(field):
+    if isinstance(field, bytes):
+        return field
+    return str(field).encode("utf-8", "surrogateescape")
+
+
+def send_message(sock, fields, fds=()):
+    payload = b"\0".join(_encode(field) for field in fields)
+    data = len(payload).to_bytes(HEADER_SIZE, "big") + payload
+    if fds:
+        rights = b"".join(fd.to_bytes(4, sys.byteorder) for fd in fds)
+        sent = sock.sendmsg([data], [(_socket.SOL_SOCKET, _socket.SCM_RIGHTS, rights)])
+        data = data[sent:]
+    sock.sendall(data)
+
+
+def _recv_exactly(sock, size):
+    data = b""
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("connection closed")
+        data += chunk
+    return data
+
+
+def recv_message(sock):
+    """The fields of the next message, as bytes."""
+    length = int.from_bytes(_recv_exactly(sock, HEADER_SIZE), "big")
+    return _recv_exactly(sock, length).split(b"\0")
+
+
+def connect(socket_path=None):
+    sock = _socket.socket(_socket.AF_UNIX, _socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path or default_socket_path())
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def run(line, socket_path=None, fds=(0, 1, 2)):
+    """Runs line on the server, with fds as its stdin, stdout and stderr,
+    and returns its exit status."""
+    sock = connect(socket_path)
+    try:
+        fields = ["run", line, posix.getcwdb()]
+        fields += [name + b"=" + value for name, value in posix.environ.items()]
+        send_message(sock, fields, fds)
+        while True:
+            try:
+                return int(recv_message(sock)[0])
+            except KeyboardInterrupt:
+                sock.sendall(b"\3")
+    finally:
+        sock.close()
+
+
+def complete(text, is_command, socket_path=None, words=()):
+    """Completions for text; words are the words before it in its command."""
+    sock = connect(socket_path)
+    try:
+        send_message(sock, ["complete", text, posix.getcwdb(), "1" if is_command else "0", *words])
+        reply = recv_message(sock)
+    finally:
+        sock.close()
+    return [match.decode("utf-8", "surrogateescape") for match in reply[1:]]
+
+
+def run_locally(line):
+    """Runs line in this process the way seashell.py -c does, for when no
+    server is listening. Cheaper than exec'ing seashell.py: the interpreter
+    is already up, and only the site setup -S skipped is still to do."""
+    import os
+    import site
+    site.main()
+    here = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, here)
+    sys.argv = [os.path.join(here, "seashell.py"), "-c", line]
+    import seashell
+    import shell_stats
+    shell_stats.run_profiled(seashell.main)
+
+
+USAGE = """usage: shell_client.py [--socket PATH] -c LINE
+       shell_client.py [--socket PATH] --complete TEXT [--command | --before LINE]"""
+
+
+def parse_args(argv):
+    # Hand-rolled rather than argparse, which alone costs a noticeable part
+    # of the time this client exists to save.
+    options = {"socket": None, "line": None, "complete": None, "command": False, "before": None}
+    argv = list(argv)
+    while argv:
+        arg = argv.pop(0)
+        if arg == "--command":
+            options["command"] = True
+        elif arg in ("--socket", "-c", "--complete", "--before") and argv:
+            options[{"-c": "line"}.get(arg, arg.lstrip("-"))] = argv.pop(0)
+        else:
+            return None
+    if (options["line"] is None) == (options["complete"] is None):
+        return None
+    return options
+
+
+def main():
+    options = parse_args(sys.argv[1:])
+    if options is None:
+        print(USAGE, file=sys.stderr)
+        sys.exit(2)
+
+    if options["complete"] is not None:
+        try:
+            words = (options["before"] or "").split()
+            matches = complete(options["complete"], options["command"], options["socket"], words)
+        except OSError as e:
+            print(f"shell_client.py: {e.strerror or e}", file=sys.stderr)
+            sys.exit(1)
+        for match in matches:
+            print(match)
+        return
+
+    try:
+        status = run(options["line"], options["socket"])
+    except (ConnectionRefusedError, FileNotFoundError):
+        run_locally(options["line"])
+        return
+    except ConnectionError:
+        # The server went away mid-request.
+        status = 1
+    sys.exit(status)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""In-process versions of small coreutils, registered as lazy builtins.
+
+Each one handles only the plain forms of its command; its accepts(args)
+turns anything else (options, reading stdin, large files) over to the real
+binary on PATH."""
+import os
+
+# Above this many bytes in total, cat runs as a process: a separate process
+# streams big files faster than a thread holding the GIL.
+CAT_INPROCESS_MAX = 1 << 20
+
+
+def builtin_true(args, stdin, stdout, stderr):
+    return 0
+
+
+def builtin_false(args, stdin, stdout, stderr):
+    return 1
+
+
+def builtin_basename(args, stdin, stdout, stderr):
+    name = args[0].rstrip("/")
+    if not name:
+        base = "/" if args[0] else ""
+    else:
+        base = name.rsplit("/", 1)[-1]
+    if len(args) == 2 and base != args[1] and base.endswith(args[1]):
+        base = base[:-len(args[1])]
+    stdout.write(base + "\n")
+    return 0
+
+
+builtin_basename.accepts = lambda args: len(args) in (1, 2) and not args[0].startswith("-")
+
+
+def _write_bytes(stream, data):
+    buffer = getattr(stream, "buffer", None)
+    if buffer is None:
+        stream.write(data.decode("utf-8", "surrogateescape"))
+        return
+    stream.flush()
+    buffer.write(data)
+
+
+def builtin_cat(args, stdin, stdout, stderr):
+    status = 0
+    for path in args:
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError as e:
+            print(f"cat: {path}: {e.strerror}", file=stderr)
+            status = 1
+            continue
+        _write_bytes(stdout, data)
+    return status
+
+
+def _cat_accepts(args):
+    if not args:
+        return False
+    total = 0
+    for path in args:
+        if path.startswith("-"):
+            return False
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        if not os.path.isfile(path):
+            return False
+        total += st.st_size
+        if total > CAT_INPROCESS_MAX:
+            return False
+    return True
+
+
+builtin_cat.accepts = _cat_accepts
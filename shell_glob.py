@@ -0,0 +1,356 @@
+"""Pathname expansion: *, ?, [...] and ** in unquoted words.
+
+A pattern is split into /-separated components, each compiled once to a
+regex; compiled patterns are cached. Literal components are joined onto
+the path without listing anything, and the literal start of a wildcard
+component (the "foo" of foo*.py) narrows the sorted directory listing by
+bisection before any regex runs.
+
+** as a whole component matches any number of directories, including
+none. Its walk reads entries with os.scandir, which gets file types from
+d_type, so no entry is stat'ed. Once a walk has seen PARALLEL_MIN_ENTRIES
+entries, the rest of the tree is walked on a pool of threads. The threads
+run concurrently while they wait in the kernel for directory reads, which
+dominate walks of large, cold trees.
+
+As in other shells, * and ? do not match a leading dot, ** does not enter
+hidden directories or follow symlinks, and results are sorted.
+"""
+import os
+import re
+import bisect
+import threading
+import functools
+from collections import namedtuple
+
+# Walks that have seen this many entries before finishing continue on
+# WALK_THREADS threads (SEASHELL_GLOB_THREADS; 1 walks on the shell's
+# thread only, the default on a single CPU).
+PARALLEL_MIN_ENTRIES = 4096
+_cpus = os.cpu_count() or 1
+WALK_THREADS = int(os.environ.get("SEASHELL_GLOB_THREADS", "0")) or (min(16, 2 * _cpus) if _cpus > 1 else 1)
+
+# A wildcard component: its literal start, and the regex for the whole name.
+Matcher = namedtuple("Matcher", "prefix regex")
+# ** as a whole component.
+RECURSIVE = object()
+
+_MAGIC = re.compile(r"[*?[\\]")
+_CLASSES = {
+    "alnum": "a-zA-Z0-9", "alpha": "a-zA-Z", "blank": " \\t", "digit": "0-9",
+    "lower": "a-z", "punct": re.escape("!\"#$%&'()*+,-./:;<=>?@[\\]^_`{|}~"),
+    "space": " \\t\\n\\r\\f\\v", "upper": "A-Z", "xdigit": "0-9A-Fa-f",
+}
+
+
+def escape(text):
+    """text with every character that means something in a pattern escaped."""
+    return _MAGIC.sub(r"\\\g<0>", text)
+
+
+def _bracket_end(pattern, i):
+    """Index of the ] closing a [ just before i, or None if there is none."""
+    n = len(pattern)
+    if i < n and pattern[i] in "!^":
+        i += 1
+    if i < n and pattern[i] == "]":
+        i += 1
+    while i < n:
+        char = pattern[i]
+        if char == "]":
+            return i
+        if char == "\\":
+            i += 1
+        elif pattern.startswith("[:", i):
+            close = pattern.find(":]", i + 2)
+            if close != -1:
+                i = close + 1
+        i += 1
+    return None
+
+
+def _bracket(body):
+    negate = body[:1] in ("!", "^")
+    if negate:
+        body = body[1:]
+    items = []
+    i = 0
+    while i < len(body):
+        if body.startswith("[:", i):
+            close = body.find(":]", i + 2)
+            if close != -1 and body[i + 2:close] in _CLASSES:
+                items.append(_CLASSES[body[i + 2:close]])
+                i = close + 2
+                continue
+        char = body[i]
+        if char == "\\" and i + 1 < len(body):
+            i += 1
+            char = body[i]
+        i += 1
+        if i + 1 < len(body) and body[i] == "-":
+            end = body[i + 1]
+            i += 2
+            if end == "\\" and i < len(body):
+                end = body[i]
+                i += 1
+            items.append(f"{re.escape(char)}-{re.escape(end)}")
+        else:
+            items.append(re.escape(char))
+    return f"[{'^' if negate else ''}{''.join(items)}]"
+
+
+def _translate(component):
+    """(prefix, regex source) for one component. prefix is its literal
+    start, unescaped; the regex is None when the component is all literal."""
+    prefix = []
+    regex = []
+    literal = True
+    i = 0
+    n = len(component)
+    while i < n:
+        char = component[i]
+        i += 1
+        if char == "\\" and i < n:
+            char = component[i]
+            i += 1
+        elif char == "*":
+            literal = False
+            if not regex or regex[-1] != ".*":
+                regex.append(".*")
+            continue
+        elif char == "?":
+            literal = False
+            regex.append(".")
+            continue
+        elif char == "[":
+            end = _bracket_end(component, i)
+            if end is not None:
+                literal = False
+                regex.append(_bracket(component[i:end]))
+                i = end + 1
+                continue
+        if literal:
+            prefix.append(char)
+        regex.append(re.escape(char))
+    return "".join(prefix), None if literal else "".join(regex)
+
+
+def has_magic(pattern):
+    """Whether pattern has an unescaped *, ? or complete [...]."""
+    i = 0
+    n = len(pattern)
+    while i < n:
+        char = pattern[i]
+        if char == "\\":
+            i += 2
+            continue
+        if char in "*?":
+            return True
+        if char == "[" and _bracket_end(pattern, i + 1) is not None:
+            return True
+        i += 1
+    return False
+
+
+@functools.lru_cache(maxsize=256)
+def compile_pattern(pattern):
+    """(root, components, dirs_only) for pattern. root is "/" or "";
+    each component is a literal name, a Matcher or RECURSIVE; dirs_only is
+    set by a trailing /."""
+    root = "/" if pattern.startswith("/") else ""
+    components = []
+    for part in pattern.split("/"):
+        if not part:
+            continue
+        if part == "**":
+            if components[-1:] != [RECURSIVE]:
+                components.append(RECURSIVE)
+            continue
+        prefix, regex = _translate(part)
+        components.append(prefix if regex is None else Matcher(prefix, re.compile(regex, re.DOTALL)))
+    return root, tuple(components), pattern.endswith("/")
+
+
+def _matches(matcher, name):
+    # A leading dot is only ever matched by a literal one.
+    if name[0] == "." and not matcher.prefix.startswith("."):
+        return False
+    return name.startswith(matcher.prefix) and matcher.regex.fullmatch(name) is not None
+
+
+def _listing(path):
+    entries = []
+    with os.scandir(path) as it:
+        for entry in it:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            entries.append((entry.name, is_dir))
+    entries.sort()
+    return [name for name, _ in entries], [is_dir for _, is_dir in entries]
+
+
+def _scan(path):
+    """(name, is_dir) for each entry of path, not following symlinks; empty
+    if it can't be read."""
+    entries = []
+    try:
+        with os.scandir(path or ".") as it:
+            for entry in it:
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                except OSError:
+                    is_dir = False
+                entries.append((entry.name, is_dir))
+    except OSError:
+        pass
+    return entries
+
+
+class _Expansion:
+    """One expansion of a pattern; results collects matching paths."""
+
+    def __init__(self, listings):
+        # listings, when given, is a DirListingCache shared between
+        # expansions; its listing(path) returns sorted names and is_dir flags.
+        self.listing = listings.listing if listings is not None else _listing
+        self.results = []
+
+    def expand(self, base, components, dirs_only):
+        component, rest = components[0], components[1:]
+        suffix = "/" if dirs_only else ""
+        if isinstance(component, str):
+            path = base + component
+            if rest:
+                self.expand(path + "/", rest, dirs_only)
+            elif os.path.isdir(path) if dirs_only else os.path.lexists(path):
+                self.results.append(path + suffix)
+            return
+        if component is RECURSIVE:
+            self.recurse(base, rest, dirs_only)
+            return
+        try:
+            names, dir_flags = self.listing(base or ".")
+        except OSError:
+            return
+        start = bisect.bisect_left(names, component.prefix)
+        end = bisect.bisect_left(names, component.prefix + "\U0010ffff", start)
+        for i in range(start, end):
+            name = names[i]
+            if not _matches(component, name):
+                continue
+            if rest:
+                if dir_flags[i]:
+                    self.expand(base + name + "/", rest, dirs_only)
+            elif dir_flags[i] or not dirs_only:
+                self.results.append(base + name + suffix)
+
+    def recurse(self, base, rest, dirs_only):
+        """Applies rest in base and every directory below it."""
+        suffix = "/" if dirs_only else ""
+        append = self.results.append
+        if not rest:
+            # a/** includes a/ itself, as ** may match no directories.
+            if base:
+                append(base)
+
+            def visit(directory, entries):
+                for name, is_dir in entries:
+                    if name[0] != "." and (is_dir or not dirs_only):
+                        append(directory + name + suffix)
+        elif len(rest) == 1 and isinstance(rest[0], Matcher):
+            # The common **/*.ext: match the walk's own entries rather than
+            # listing every directory a second time.
+            fullmatch = rest[0].regex.fullmatch
+            dot = rest[0].prefix.startswith(".")
+            extend = self.results.extend
+
+            def visit(directory, entries):
+                extend([directory + name + suffix for name, is_dir in entries
+                        if (is_dir or not dirs_only) and (dot or name[0] != ".") and fullmatch(name)])
+        else:
+            def visit(directory, entries):
+                self.expand(directory, rest, dirs_only)
+        walk(base, visit)
+
+
+def _subdirs(directory, entries):
+    return [directory + name + "/" for name, is_dir in entries if is_dir and name[0] != "."]
+
+
+def walk(top, visit):
+    """Calls visit(directory, entries) for top and each non-hidden directory
+    below it; directory is a path prefix ending in / (top itself may be "").
+    Large trees are finished on WALK_THREADS threads, so visit must be
+    safe to call from several threads at once."""
+    pending = [top]
+    seen = 0
+    while pending:
+        if seen >= PARALLEL_MIN_ENTRIES and WALK_THREADS > 1:
+            _walk_parallel(pending, visit)
+            return
+        directory = pending.pop()
+        entries = _scan(directory)
+        seen += len(entries)
+        visit(directory, entries)
+        pending += _subdirs(directory, entries)
+
+
+def _walk_parallel(pending, visit):
+    # A shared stack rather than one task per subtree, so a single huge
+    # subtree is still split between threads.
+    lock = threading.Condition()
+    busy = 0
+    errors = []
+
+    def worker():
+        nonlocal busy
+        while True:
+            with lock:
+                while not pending and busy:
+                    lock.wait()
+                if not pending:
+                    lock.notify_all()
+                    return
+                directory = pending.pop()
+                busy += 1
+            try:
+                entries = _scan(directory)
+                visit(directory, entries)
+                subdirs = _subdirs(directory, entries)
+            except BaseException as e:
+                errors.append(e)
+                subdirs = []
+            with lock:
+                busy -= 1
+                pending.extend(subdirs)
+                lock.notify_all()
+
+    threads = [threading.Thread(target=worker, name="glob-walk", daemon=True)
+               for _ in range(WALK_THREADS)]
+    for thread in threads:
+        thread.start()
+    try:
+        for thread in threads:
+            thread.join()
+    except BaseException:
+        # Ctrl-C: let the workers run out of directories and stop.
+        with lock:
+            pending.clear()
+        raise
+    if errors:
+        raise errors[0]
+
+
+def glob(pattern, listings=None):
+    """Sorted paths matching pattern, or [] if none do or it has no
+    wildcards. Backslash escapes the next character."""
+    if not has_magic(pattern):
+        return []
+    root, components, dirs_only = compile_pattern(pattern)
+    if not components:
+        return []
+    expansion = _Expansion(listings)
+    expansion.expand(root, components, dirs_only)
+    return sorted(set(expansion.results))
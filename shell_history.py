@@ -0,0 +1,182 @@
+import os
+import mmap
+import fcntl
+import bisect
+from array import array
+
+
+def default_history_file():
+    return os.environ.get("SEASHELL_HISTFILE") or os.path.expanduser("~/.seashell_history")
+
+
+def _join_continuations(line):
+    """line without its backslash-newline continuations, as the shell reads
+    it. Inside quotes they are part of the string and stay."""
+    if "\\\n" not in line:
+        return line
+    out = []
+    quote = None
+    i = 0
+    while i < len(line):
+        char = line[i]
+        if quote == "'":
+            if char == "'":
+                quote = None
+        elif char == "\\":
+            if quote is None and line[i + 1:i + 2] == "\n":
+                i += 2
+                continue
+            out.append(line[i:i + 2])
+            i += 2
+            continue
+        elif char == quote:
+            quote = None
+        elif quote is None and char in "'\"":
+            quote = char
+        out.append(char)
+        i += 1
+    return "".join(out)
+
+
+def _encode_entry(line):
+    # One entry per line in the file: newlines are stored as \n, and
+    # backslashes as \\ so that a literal \n reads back as itself.
+    return line.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _decode_entry(text):
+    if "\\" not in text:
+        return text
+    return "\\".join(part.replace("\\n", "\n") for part in text.split("\\\\"))
+
+
+class HistoryFile:
+    """Persistent command history: one command per line in an append-only file.
+
+    Appends take an flock and go out in a single O_APPEND write, so several
+    sessions can share the file. Nothing is read at startup: the file is
+    mmapped on first use and only the part appended since the last look is
+    indexed. Searches run over the mapping with bytes.find, and matches are
+    mapped back to line numbers with a bisect over the line offsets.
+
+    A command that spans lines is stored on one: continuations are joined,
+    and the newlines left (in quotes, or between commands) are escaped."""
+
+    def __init__(self, path=None):
+        self.path = path or default_history_file()
+        self._map = None
+        self._size = 0
+        self._offsets = array("Q")
+
+    def append(self, line):
+        line = _join_continuations(line).strip()
+        if not line:
+            return
+        data = (_encode_entry(line) + "\n").encode("utf-8", "surrogateescape")
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+
+    def _refresh(self):
+        try:
+            size = os.stat(self.path).st_size
+        except FileNotFoundError:
+            size = 0
+        if size == self._size and self._map is not None:
+            return
+        if size < self._size:
+            # Truncated or replaced: start over.
+            self._offsets = array("Q")
+            self._size = 0
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if size == 0:
+            return
+
+        with open(self.path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        size = len(self._map)
+
+        # Index the complete lines added since the last refresh; a line still
+        # being written by another session (no newline yet) waits for later.
+        mapping = self._map
+        offsets = self._offsets
+        pos = self._size
+        end = mapping.find(b"\n", pos)
+        while end != -1:
+            offsets.append(pos)
+            pos = end + 1
+            end = mapping.find(b"\n", pos)
+        self._size = pos
+
+    def __len__(self):
+        self._refresh()
+        return len(self._offsets)
+
+    def _line(self, index):
+        start = self._offsets[index]
+        end = self._map.find(b"\n", start)
+        return _decode_entry(self._map[start:end].decode("utf-8", "surrogateescape"))
+
+    def entries(self, start=0, stop=None):
+        """(number, command) pairs, numbered from 1, for lines start..stop."""
+        self._refresh()
+        stop = len(self._offsets) if stop is None else min(stop, len(self._offsets))
+        for index in range(max(start, 0), stop):
+            yield index + 1, self._line(index)
+
+    def tail(self, count):
+        """The last count commands, read from the end of the file without
+        indexing the rest of it."""
+        try:
+            with open(self.path, "rb") as f:
+                mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            return []
+        with mapping:
+            end = mapping.rfind(b"\n")
+            lines = []
+            while end > 0 and len(lines) < count:
+                start = mapping.rfind(b"\n", 0, end) + 1
+                lines.append(_decode_entry(mapping[start:end].decode("utf-8", "surrogateescape")))
+                end = start - 1
+        lines.reverse()
+        return lines
+
+    def _indices_at(self, needle, at_line_start):
+        self._refresh()
+        if self._map is None or not needle:
+            return []
+        mapping = self._map
+        offsets = self._offsets
+        limit = self._size
+        indices = []
+        if at_line_start:
+            if mapping[:len(needle)] == needle:
+                indices.append(0)
+            needle = b"\n" + needle
+        pos = mapping.find(needle, 0, limit)
+        while pos != -1:
+            index = bisect.bisect_right(offsets, pos + (1 if at_line_start else 0)) - 1
+            if not indices or indices[-1] != index:
+                indices.append(index)
+            # Skip to the next line; one match per command is enough.
+            next_line = mapping.find(b"\n", pos + (1 if at_line_start else 0))
+            if next_line == -1:
+                break
+            pos = mapping.find(needle, next_line if at_line_start else next_line + 1, limit)
+        return indices
+
+    def search(self, text):
+        """(number, command) pairs for commands containing text."""
+        needle = _encode_entry(text).encode("utf-8", "surrogateescape")
+        return [(i + 1, self._line(i)) for i in self._indices_at(needle, False)]
+
+    def prefix(self, text):
+        """(number, command) pairs for commands starting with text."""
+        needle = _encode_entry(text).encode("utf-8", "surrogateescape")
+        return [(i + 1, self._line(i)) for i in self._indices_at(needle, True)]
@@ -0,0 +1,381 @@
+import re
+import shlex
+import functools
+from collections import namedtuple
+
+# A simple command: its words and its redirections, as (operator, target).
+# Words are strings, or Word when they need expanding before each run.
+Command = namedtuple("Command", "argv redirects")
+# A word built from (kind, value, quoted) parts: LITERAL text, or a SUBST
+# whose value is the source of a $(...) / `...` command substitution.
+# Unquoted LITERAL text may hold glob characters, expanded against the
+# filesystem when the command runs.
+Word = namedtuple("Word", "parts")
+# Commands joined by |.
+Pipeline = namedtuple("Pipeline", "commands")
+# Pipelines joined by && / ||; operators[i] sits between pipelines i and i+1.
+AndOr = namedtuple("AndOr", "pipelines operators")
+# A whole line: (AndOr, background) items separated by ; or &.
+CommandList = namedtuple("CommandList", "items")
+
+# Redirection operators, each optionally preceded by an fd number (2>, 0<).
+REDIRECT_OPS = (">", ">>", "<", ">&", "<&", "<<<")
+LIST_OPS = (";", "&")
+AND_OR_OPS = ("&&", "||")
+
+WORD = "word"
+OP = "op"
+
+LITERAL = "literal"
+SUBST = "subst"
+
+_GLOB_CHAR = re.compile(r"[*?[]")
+
+
+class ParseError(ValueError):
+    pass
+
+
+class IncompleteInput(ParseError):
+    """The input ends inside a command: in an open quote or substitution,
+    after a trailing backslash, or after |, && or ||. More lines may
+    complete it."""
+
+
+def is_redirect(op):
+    return op.lstrip("0123456789") in REDIRECT_OPS
+
+
+_TOKEN = re.compile(r"""
+    (?P<space>[ \t\r]+)
+  | (?P<newline>\n)
+  | (?P<op><<<|\|\||&&|>>|>&|<&|[|&;<>])
+  | (?P<plain>(?:[^ \t\r\n'"\\|&;<>$`]|\$(?!\())+)
+  | (?P<single>'[^']*')
+  | (?P<double>"(?:[^"\\$`]|\\.|\$(?!\())*")
+  | (?P<dquote>")
+  | (?P<subst>\$\()
+  | (?P<backtick>`)
+  | (?P<escape>\\.?)
+""", re.VERBOSE | re.DOTALL)
+
+_FD_PREFIXED = (">", ">>", "<", ">&", "<&")
+
+_DOUBLE_QUOTE_ESCAPE = re.compile(r'\\([$`"\\\n])')
+_BACKTICK_ESCAPE = re.compile(r'\\([$`\\])')
+# Inside $(...): runs of characters that can't open or close anything.
+_SUBST_PLAIN = re.compile(r"""[^()'"`\\$]+""")
+# Inside "...": runs of characters that are taken literally.
+_DOUBLE_PLAIN = re.compile(r'[^"\\$`]+|\$(?!\()')
+
+
+def _eof(quote):
+    return IncompleteInput(f"unexpected EOF while looking for matching `{quote}'")
+
+
+def _scan_subst(line, pos):
+    """Finds the ) closing a $( that ends just before pos. Returns the
+    command text between them and the position after the )."""
+    start = pos
+    depth = 1
+    end = len(line)
+    while pos < end:
+        m = _SUBST_PLAIN.match(line, pos)
+        if m:
+            pos = m.end()
+            continue
+        char = line[pos]
+        if char == "\\":
+            pos += 2
+        elif char == "'":
+            close = line.find("'", pos + 1)
+            if close == -1:
+                raise _eof("'")
+            pos = close + 1
+        elif char == '"':
+            _, pos = _scan_double(line, pos + 1)
+        elif char == "`":
+            _, pos = _scan_backtick(line, pos + 1)
+        elif line.startswith("$(", pos):
+            _, pos = _scan_subst(line, pos + 2)
+        elif char == "(":
+            depth += 1
+            pos += 1
+        elif char == ")":
+            depth -= 1
+            pos += 1
+            if depth == 0:
+                return line[start:pos - 1], pos
+        else:
+            pos += 1
+    raise _eof(")")
+
+
+def _scan_backtick(line, pos):
+    """Finds the ` closing one that ends just before pos. Returns the
+    command text, with \\`, \\$ and \\\\ unescaped, and the position after it."""
+    start = pos
+    end = len(line)
+    while pos < end:
+        char = line[pos]
+        if char == "\\":
+            pos += 2
+        elif char == "`":
+            return _BACKTICK_ESCAPE.sub(r"\1", line[start:pos]), pos + 1
+        else:
+            pos += 1
+    raise _eof("`")
+
+
+def _scan_double(line, pos):
+    """Reads a double-quoted string that contains substitutions, from just
+    after its opening quote. Returns its parts and the position after the
+    closing quote."""
+    parts = []
+    end = len(line)
+    while pos < end:
+        m = _DOUBLE_PLAIN.match(line, pos)
+        if m:
+            parts.append((LITERAL, m.group(), True))
+            pos = m.end()
+            continue
+        char = line[pos]
+        if char == '"':
+            return parts, pos + 1
+        if char == "\\":
+            escaped = line[pos:pos + 2]
+            parts.append((LITERAL, _DOUBLE_QUOTE_ESCAPE.sub(r"\1", escaped), True))
+            pos += 2
+        elif char == "`":
+            source, pos = _scan_backtick(line, pos + 1)
+            parts.append((SUBST, _checked(source), True))
+        else:
+            source, pos = _scan_subst(line, pos + 2)
+            parts.append((SUBST, _checked(source), True))
+    raise _eof('"')
+
+
+def _checked(source):
+    # Parse substitutions up front so syntax errors show when the line is
+    # read rather than when it runs; parse() caches the result for later.
+    try:
+        parse(source)
+    except IncompleteInput as e:
+        # The substitution is closed, so no further input can finish it.
+        raise ParseError(str(e)) from None
+    return source
+
+
+def _make_word(parts):
+    if all(kind == LITERAL and (quoted or not _GLOB_CHAR.search(value))
+           for kind, value, quoted in parts):
+        return "".join(value for _, value, _ in parts)
+    merged = []
+    for part in parts:
+        if merged and part[0] == LITERAL and merged[-1][0] == LITERAL and merged[-1][2] == part[2]:
+            merged[-1] = (LITERAL, merged[-1][1] + part[1], part[2])
+        else:
+            merged.append(part)
+    return Word(tuple(merged))
+
+
+def tokenize(line):
+    """Splits a line into (WORD, word) and (OP, operator) tokens in one pass.
+
+    Quoting works as in POSIX shells, so a quoted "|" or ">" is an ordinary
+    word. Newlines separate commands like ;, except after |, && or ||. A #
+    at the start of a word begins a comment to the end of its line, and a
+    run of digits right before a redirection is taken as its fd (2>, 2>&1,
+    0<). Words are
+    plain strings unless they contain $(...), `...` or unquoted *, ? or [,
+    which makes them a Word to be expanded when the command runs."""
+    tokens = []
+    parts = []
+    quoted = False
+    in_word = False
+    pos = 0
+    end = len(line)
+    match = _TOKEN.match
+    while pos < end:
+        m = match(line, pos)
+        if m is None:
+            raise _eof(line[pos])
+        kind = m.lastgroup
+        text = m.group()
+        pos = m.end()
+
+        if kind == "plain":
+            if not in_word and text[0] == "#":
+                # A comment runs to the end of its line.
+                pos = line.find("\n", m.start())
+                if pos == -1:
+                    break
+                continue
+            parts.append((LITERAL, text, False))
+            in_word = True
+        elif kind == "single":
+            parts.append((LITERAL, text[1:-1], True))
+            quoted = in_word = True
+        elif kind == "double":
+            parts.append((LITERAL, _DOUBLE_QUOTE_ESCAPE.sub(r"\1", text[1:-1]), True))
+            quoted = in_word = True
+        elif kind == "dquote":
+            inner, pos = _scan_double(line, pos)
+            parts += inner or [(LITERAL, "", True)]
+            quoted = in_word = True
+        elif kind == "subst":
+            source, pos = _scan_subst(line, pos)
+            parts.append((SUBST, _checked(source), False))
+            in_word = True
+        elif kind == "backtick":
+            source, pos = _scan_backtick(line, pos)
+            parts.append((SUBST, _checked(source), False))
+            in_word = True
+        elif kind == "escape":
+            if pos == end and text in ("\\", "\\\n"):
+                raise IncompleteInput("unexpected EOF after `\\'")
+            if text != "\\\n":
+                parts.append((LITERAL, text[1:], True))
+                quoted = in_word = True
+        else:
+            if in_word:
+                word = _make_word(parts)
+                if (kind == "op" and text in _FD_PREFIXED and not quoted
+                        and isinstance(word, str) and word.isdigit()):
+                    text = word + text
+                else:
+                    tokens.append((WORD, word))
+                parts = []
+                quoted = in_word = False
+            if kind == "op":
+                tokens.append((OP, text))
+            elif kind == "newline":
+                tokens.append((OP, "\n"))
+    if in_word:
+        tokens.append((WORD, _make_word(parts)))
+    return tokens
+
+
+def _unexpected(token):
+    return ParseError(f"syntax error near unexpected token `{token}'")
+
+
+def parse_tokens(tokens):
+    items = []
+    pipelines = []
+    operators = []
+    commands = []
+    argv = []
+    redirects = []
+    pending = None
+
+    def end_command(token):
+        nonlocal argv, redirects
+        if pending is not None:
+            raise _unexpected(token)
+        if not argv and not redirects:
+            raise _unexpected(token)
+        commands.append(Command(tuple(argv), tuple(redirects)))
+        argv, redirects = [], []
+
+    def end_pipeline():
+        nonlocal commands
+        pipelines.append(Pipeline(tuple(commands)))
+        commands = []
+
+    def end_and_or(background):
+        nonlocal pipelines, operators
+        items.append((AndOr(tuple(pipelines), tuple(operators)), background))
+        pipelines, operators = [], []
+
+    for kind, value in tokens:
+        if kind == WORD:
+            if pending is not None:
+                redirects.append((pending, value))
+                pending = None
+            else:
+                argv.append(value)
+        elif value == "\n":
+            # A newline ends a command like ;, but is skipped where a
+            # command is still to come (after |, && or ||, or on a blank line).
+            if pending is not None:
+                raise _unexpected("newline")
+            if argv or redirects:
+                end_command(value)
+                end_pipeline()
+                end_and_or(False)
+        elif is_redirect(value):
+            if pending is not None:
+                raise _unexpected(value)
+            pending = value
+        elif value == "|":
+            end_command(value)
+        elif value in AND_OR_OPS:
+            end_command(value)
+            end_pipeline()
+            operators.append(value)
+        else:
+            end_command(value)
+            end_pipeline()
+            end_and_or(value == "&")
+
+    if pending is not None:
+        raise _unexpected("newline")
+    if argv or redirects:
+        end_command("newline")
+        end_pipeline()
+        end_and_or(False)
+    elif commands or operators:
+        raise IncompleteInput("syntax error: unexpected end of file")
+    return CommandList(tuple(items))
+
+
+@functools.lru_cache(maxsize=4096)
+def parse(line):
+    """Parses one input line into a CommandList. Results are memoised, so
+    lines repeated in loops or re-run from history are parsed once; the AST
+    is made of tuples and must not be modified."""
+    return parse_tokens(tokenize(line))
+
+
+def pipeline_from_words(words):
+    """Builds a Pipeline from an already split word list, treating bare "|"
+    and redirection operator words as operators."""
+    tokens = [(OP, w) if w == "|" or is_redirect(w) else (WORD, w) for w in words]
+    command_list = parse_tokens(tokens)
+    if len(command_list.items) != 1 or command_list.items[0][0].operators:
+        raise ParseError("expected a single pipeline")
+    return command_list.items[0][0].pipelines[0]
+
+
+def unparse_word(word):
+    if isinstance(word, str):
+        return shlex.quote(word)
+    text = []
+    for kind, value, quoted in word.parts:
+        if kind == SUBST:
+            text.append(f'"$({value})"' if quoted else f"$({value})")
+        else:
+            text.append(shlex.quote(value) if quoted or not value else value)
+    return "".join(text)
+
+
+def unparse_command(command):
+    words = [unparse_word(word) for word in command.argv]
+    for op, target in command.redirects:
+        if op.endswith("&") and isinstance(target, str) and target.isdigit():
+            words.append(op + target)
+        else:
+            words.append(f"{op} {unparse_word(target)}")
+    return " ".join(words)
+
+
+def unparse_pipeline(pipeline):
+    return " | ".join(unparse_command(command) for command in pipeline.commands)
+
+
+def unparse_and_or(and_or):
+    text = unparse_pipeline(and_or.pipelines[0])
+    for op, pipeline in zip(and_or.operators, and_or.pipelines[1:]):
+        text += f" {op} {unparse_pipeline(pipeline)}"
+    return text
@@ -0,0 +1,236 @@
+"""Persistent shell server: runs command lines for shell_client.py.
+
+The server builds the command Trie, indexes history and imports the
+modules commands need once, then forks a child per request, so every
+request starts from that warm state. A request carries the client's cwd,
+environment and stdin/stdout/stderr (passed as fds with SCM_RIGHTS); the
+child runs the line on those fds and sends back the exit status.
+
+Wire format, both directions: a 4-byte big-endian length, then that many
+bytes of NUL-separated fields.
+
+    client -> server   run, line, cwd, NAME=value...        (+ fds 0, 1, 2)
+                       complete, text, cwd, 1 for a command name else 0,
+                                 words before text in its command...
+    server -> client   status, fields...
+
+While a run request is in progress the client may send one more byte to
+interrupt it; closing the connection does the same.
+"""
+import os
+import sys
+import socket
+import struct
+import signal
+
+HEADER = struct.Struct("!I")
+
+
+def default_socket_path():
+    if os.environ.get("SEASHELL_SOCKET"):
+        return os.environ["SEASHELL_SOCKET"]
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return os.path.join(runtime_dir, "seashell.sock")
+    return f"/tmp/seashell-{os.getuid()}.sock"
+
+
+def _encode(field):
+    if isinstance(field, bytes):
+        return field
+    return str(field).encode("utf-8", "surrogateescape")
+
+
+def send_message(sock, fields, fds=()):
+    payload = b"\0".join(_encode(field) for field in fields)
+    data = HEADER.pack(len(payload)) + payload
+    if fds:
+        sent = socket.send_fds(sock, [data], list(fds))
+        data = data[sent:]
+    sock.sendall(data)
+
+
+def recv_message(sock, maxfds=0):
+    """(fields, fds) for the next message; fields are bytes. Raises
+    ConnectionError when the peer goes away first."""
+    if maxfds:
+        data, fds, _, _ = socket.recv_fds(sock, 65536, maxfds)
+    else:
+        data, fds = sock.recv(65536), []
+    while len(data) < HEADER.size:
+        chunk = sock.recv(HEADER.size - len(data))
+        if not chunk:
+            raise ConnectionError("connection closed")
+        data += chunk
+    (length,) = HEADER.unpack_from(data)
+    data = data[HEADER.size:]
+    while len(data) < length:
+        chunk = sock.recv(length - len(data))
+        if not chunk:
+            raise ConnectionError("connection closed")
+        data += chunk
+    return data[:length].split(b"\0"), fds
+
+
+class ShellServer:
+    """Listens on a Unix socket and runs each request in a forked child."""
+
+    def __init__(self, socket_path=None):
+        self.socket_path = socket_path or default_socket_path()
+        self.listener = None
+        self.completer = None
+
+    def warm_up(self):
+        """Loads everything a request would otherwise load for itself."""
+        import selectors, subprocess, shutil, json, resource
+        import shell_utils as utils
+        import shell_history
+        self.utils = utils
+        self.completer = utils.ShellCompleter()
+        self.completer.argument_completer()
+        utils.command_history = shell_history.HistoryFile()
+        len(utils.command_history)
+        for name in utils.builtin_registry.names():
+            utils.builtin_registry.get(name)
+
+    def listen(self):
+        if os.path.exists(self.socket_path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.socket_path)
+            except OSError:
+                os.unlink(self.socket_path)
+            else:
+                raise OSError(f"{self.socket_path}: a server is already listening")
+            finally:
+                probe.close()
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        old_umask = os.umask(0o077)
+        try:
+            self.listener.bind(self.socket_path)
+        finally:
+            os.umask(old_umask)
+        self.listener.listen(64)
+
+    def serve_forever(self):
+        # Children are reaped by the kernel; the server never waits on them.
+        signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+        # Exit through the finally below so the socket file goes away.
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+        try:
+            while True:
+                conn, _ = self.listener.accept()
+                try:
+                    self._handle(conn)
+                except (ConnectionError, ValueError, IndexError):
+                    pass
+                finally:
+                    conn.close()
+        finally:
+            self.listener.close()
+            try:
+                os.unlink(self.socket_path)
+            except OSError:
+                pass
+
+    def _same_user(self, conn):
+        if not hasattr(socket, "SO_PEERCRED"):
+            return True
+        creds = conn.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+        _, uid, _ = struct.unpack("3i", creds)
+        return uid == os.getuid()
+
+    def _handle(self, conn):
+        if not self._same_user(conn):
+            return
+        fields, fds = recv_message(conn, 3)
+        try:
+            op = fields[0]
+            if op == b"complete":
+                cwd = os.fsdecode(fields[2])
+                if cwd != os.getcwd():
+                    # Listings are cached by the path as typed, which is
+                    # relative to the client's cwd.
+                    os.chdir(cwd)
+                    self.completer.dir_cache.clear()
+                text, *words = [field.decode("utf-8", "surrogateescape")
+                                for field in (fields[1], *fields[4:])]
+                matches = self.completer.find_completions(text, fields[3] == b"1", words)
+                send_message(conn, [0] + [match.rstrip() for match in matches])
+            elif op == b"run" and len(fds) == 3:
+                if os.fork() == 0:
+                    status = 1
+                    try:
+                        status = self._run(conn, fields, fds)
+                    finally:
+                        os._exit(status)
+        finally:
+            for fd in fds:
+                os.close(fd)
+
+    def _run(self, conn, fields, fds):
+        """Runs in the forked child: takes on the client's fds, cwd and
+        environment, runs the line and replies with its status."""
+        import threading
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        self.listener.close()
+        for target, fd in enumerate(fds):
+            os.dup2(fd, target)
+        for fd in set(fds) - {0, 1, 2}:
+            os.close(fd)
+
+        line = fields[1].decode("utf-8", "surrogateescape")
+        os.environ.clear()
+        for entry in fields[3:]:
+            name, _, value = entry.partition(b"=")
+            os.environb[name] = value
+
+        def watch_client():
+            # Any byte, or the client going away, interrupts the line.
+            try:
+                conn.recv(1)
+            except OSError:
+                pass
+            os.kill(os.getpid(), signal.SIGINT)
+
+        threading.Thread(target=watch_client, daemon=True).start()
+        try:
+            os.chdir(os.fsdecode(fields[2]))
+            status = self.utils.run_lines(line.splitlines())
+        except OSError as e:
+            print(f"seashell: {e.filename}: {e.strerror}", file=sys.stderr)
+            status = 1
+        except SystemExit as e:
+            status = e.code if isinstance(e.code, int) else 0
+        except KeyboardInterrupt:
+            status = 130
+        sys.stdout.flush()
+        sys.stderr.flush()
+        send_message(conn, [status])
+        return status
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Run a persistent seashell server.")
+    parser.add_argument("--socket", help=f"socket path (default: {default_socket_path()})")
+    parser.add_argument("options", nargs="*", help="shell options, e.g. --spawn=popen")
+    args, extra = parser.parse_known_args()
+    server = ShellServer(args.socket)
+    server.warm_up()
+    try:
+        server.utils.apply_shell_options(args.options + extra)
+        server.listen()
+    except (OSError, ValueError) as e:
+        print(f"shell_server.py: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(f"seashell server listening on {server.socket_path}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
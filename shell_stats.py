@@ -0,0 +1,148 @@
+"""Counters and latency histograms for the shell's own work.
+
+Each phase (parsing a line, applying redirections, resolving a command,
+spawning it, waiting for a pipeline, completing a word, ...) keeps a count,
+a total, a maximum and a histogram with one bucket per power of two
+nanoseconds. Call sites bracket a phase with
+
+    started = shell_stats.start()
+    ...
+    shell_stats.stop("spawn", started)
+
+While collection is off, start() returns 0 and stop() returns at once, so
+an instrumented path pays two cheap calls and no clock reads. Collection
+is on when SEASHELL_STATS is set, or after stats -e.
+
+SEASHELL_PROFILE=path runs the whole shell under cProfile instead and
+writes the profile to path on exit (read it with python -m pstats path).
+"""
+import os
+import time
+
+enabled = bool(os.environ.get("SEASHELL_STATS"))
+
+# 2**63 ns is some three centuries; nothing lands beyond the last bucket.
+BUCKETS = 64
+
+PHASES = ("line", "parse", "glob", "redirect", "resolve", "spawn", "builtin", "wait", "complete")
+
+
+class Phase:
+    __slots__ = ("name", "count", "total_ns", "max_ns", "buckets")
+
+    def __init__(self, name):
+        self.name = name
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+        self.buckets = [0] * BUCKETS
+
+    def add(self, elapsed_ns):
+        # Updates from builtin threads can interleave; the numbers are for
+        # finding hot spots, not accounting, so there is no lock.
+        self.count += 1
+        self.total_ns += elapsed_ns
+        if elapsed_ns > self.max_ns:
+            self.max_ns = elapsed_ns
+        self.buckets[min(elapsed_ns.bit_length(), BUCKETS - 1)] += 1
+
+    def percentile(self, fraction):
+        """Upper bound, in ns, of the bucket holding the given fraction of
+        samples: within a factor of two of the true value."""
+        wanted = fraction * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if n and seen >= wanted:
+                return min(1 << i, self.max_ns)
+        return self.max_ns
+
+
+phases = {name: Phase(name) for name in PHASES}
+counters = dict.fromkeys(("pipelines", "external", "builtin inline", "builtin thread"), 0)
+
+
+def start():
+    return time.perf_counter_ns() if enabled else 0
+
+
+def stop(phase, started):
+    if started:
+        phases[phase].add(time.perf_counter_ns() - started)
+
+
+def count(name):
+    if enabled:
+        counters[name] = counters.get(name, 0) + 1
+
+
+def reset():
+    for phase in phases.values():
+        phase.reset()
+    for name in counters:
+        counters[name] = 0
+
+
+def format_ns(ns):
+    if ns < 1000:
+        return f"{ns}ns"
+    if ns < 1000000:
+        return f"{ns / 1e3:.1f}us"
+    if ns < 1000000000:
+        return f"{ns / 1e6:.2f}ms"
+    return f"{ns / 1e9:.2f}s"
+
+
+def report(stream):
+    columns = ("count", "total", "mean", "p50", "p90", "p99", "max")
+    print(f"{'phase':<10}" + "".join(f"{c:>10}" for c in columns), file=stream)
+    for phase in phases.values():
+        if not phase.count:
+            continue
+        values = [str(phase.count)] + [format_ns(ns) for ns in (
+            phase.total_ns, phase.total_ns // phase.count, phase.percentile(0.5),
+            phase.percentile(0.9), phase.percentile(0.99), phase.max_ns)]
+        print(f"{phase.name:<10}" + "".join(f"{v:>10}" for v in values), file=stream)
+    for name, value in counters.items():
+        print(f"{name:<20}{value:>10}", file=stream)
+
+
+def builtin_stats(args, stdin, stdout, stderr):
+    """stats [-e|-d] [-r]: print the phase table, turn collection on or off,
+    or reset everything. Percentiles are bucket bounds, good to 2x."""
+    global enabled
+    for arg in args:
+        if arg == "-e":
+            enabled = True
+        elif arg == "-d":
+            enabled = False
+        elif arg == "-r":
+            reset()
+        else:
+            print(f"stats: {arg}: invalid option", file=stderr)
+            print("stats: usage: stats [-e|-d] [-r]", file=stderr)
+            return 2
+    if args:
+        return 0
+    if not enabled and not any(phase.count for phase in phases.values()):
+        print("stats: collection is off; set SEASHELL_STATS=1 or run stats -e", file=stderr)
+        return 1
+    report(stdout)
+    return 0
+
+
+def run_profiled(func):
+    """Calls func, under cProfile when SEASHELL_PROFILE names an output
+    file; the profile is written however func exits."""
+    path = os.environ.get("SEASHELL_PROFILE")
+    if not path:
+        return func()
+    import cProfile
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func)
+    finally:
+        profiler.dump_stats(path)
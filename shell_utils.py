@@ -1,275 +1,2321 @@
 import sys
 import os
-import subprocess
-import readline
-import random
-import shutil
+import time
+import errno
+import threading
+import bisect
+import itertools
+from collections import OrderedDict
+import shell_stats
+
+# Modules only some code paths need (json, subprocess, selectors, readline,
+# random, shutil) are imported where they are used, so they don't add to
+# the time before the first prompt. So are signal and re, which bring in
+# enum, and shell_parser, which compiles its regexes on import: nothing
+# before the first prompt needs them.
 
 class TrieNode:
-    def __init__(self):
+    __slots__ = ("label", "children", "keys", "is_end_of_word", "count")
+
+    def __init__(self, label=""):
+        self.label = label
         self.children = {}
+        # First characters of the children, kept sorted so queries never sort.
+        self.keys = []
         self.is_end_of_word = False
+        # Number of words in this subtree, so match counts need no walk.
+        self.count = 0
 
 class Trie:
+    """Path-compressed radix tree: each node holds a whole run of characters
+    instead of one node (and one dict) per character."""
+
     def __init__(self):
         self.root = TrieNode()
 
+    def _add_child(self, node, child):
+        first = child.label[0]
+        if first not in node.children:
+            bisect.insort(node.keys, first)
+        node.children[first] = child
+
     def insert(self, word):
         node = self.root
-        for char in word:
-            if char not in node.children:
-                node.children[char] = TrieNode()
-            node = node.children[char]
-        node.is_end_of_word = True
+        path = [node]
+        i = 0
+        while i < len(word):
+            child = node.children.get(word[i])
+            if child is None:
+                leaf = TrieNode(word[i:])
+                leaf.is_end_of_word = True
+                self._add_child(node, leaf)
+                path.append(leaf)
+                break
 
-    def find_matches(self, prefix):
+            label = child.label
+            limit = min(len(label), len(word) - i)
+            common = 1
+            while common < limit and label[common] == word[i + common]:
+                common += 1
+
+            if common < len(label):
+                split = TrieNode(label[:common])
+                split.count = child.count
+                child.label = label[common:]
+                self._add_child(split, child)
+                node.children[word[i]] = split
+                child = split
+            node = child
+            path.append(node)
+            i += common
+        else:
+            if node.is_end_of_word:
+                return
+            node.is_end_of_word = True
+        for node in path:
+            node.count += 1
+
+    def remove(self, word):
+        node = self.root
+        parents = []
+        i = 0
+        while i < len(word):
+            child = node.children.get(word[i])
+            if child is None or not word.startswith(child.label, i):
+                return False
+            parents.append(node)
+            node = child
+            i += len(child.label)
+        if not node.is_end_of_word:
+            return False
+
+        node.is_end_of_word = False
+        node.count -= 1
+        for parent in parents:
+            parent.count -= 1
+        if not node.children and parents:
+            parent = parents.pop()
+            first = node.label[0]
+            del parent.children[first]
+            parent.keys.remove(first)
+            node = parent
+        if parents and not node.is_end_of_word and len(node.children) == 1:
+            # Fold the only child back into this node to keep paths compressed.
+            (child,) = node.children.values()
+            node.label += child.label
+            node.children = child.children
+            node.keys = child.keys
+            node.is_end_of_word = child.is_end_of_word
+        return True
+
+    def _find_node(self, prefix):
         node = self.root
+        path = []
+        i = 0
+        while i < len(prefix):
+            child = node.children.get(prefix[i])
+            if child is None:
+                return None, None
+            label = child.label
+            if prefix.startswith(label, i):
+                i += len(label)
+            elif label.startswith(prefix[i:]):
+                i = len(prefix)
+            else:
+                return None, None
+            path.append(label)
+            node = child
+        return node, "".join(path)
+
+    def iter_matches(self, prefix):
+        """Yields the words starting with prefix in sorted order, walking
+        only as much of the tree as the caller consumes."""
+        node, base = self._find_node(prefix)
+        if node is None:
+            return
+
+        stack = [(node, base)]
+        while stack:
+            node, word = stack.pop()
+            if node.is_end_of_word:
+                yield word
+            children = node.children
+            for key in reversed(node.keys):
+                child = children[key]
+                stack.append((child, word + child.label))
+
+    def common_prefix(self, prefix):
+        """The longest string every word starting with prefix starts with."""
+        node, base = self._find_node(prefix)
+        if node is None:
+            return prefix
+        # The root is never merged with its only child, so an empty prefix
+        # can stop above a shared start; walk down to it.
+        while len(node.children) == 1 and not node.is_end_of_word:
+            node = next(iter(node.children.values()))
+            base += node.label
+        return base
+
+    def count_matches(self, prefix):
+        node, _ = self._find_node(prefix)
+        return node.count if node is not None else 0
+
+    def find_matches(self, prefix):
+        return list(self.iter_matches(prefix))
+
+
+
+PATH_INDEX_VERSION = 1
+# Directories modified this close to a scan may still be changing within the
+# same mtime tick, so cached listings of them are not trusted (same idea as
+# git's "racily clean" index entries).
+RACY_MTIME_NS = 2 * 10**9
+
+def default_path_index_file():
+    override = os.environ.get("SEASHELL_PATH_INDEX")
+    if override:
+        return override
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(cache_home, "seashell", "path_index.json")
+
+def scan_path_dir(path_dir):
+    commands = []
+    with os.scandir(path_dir) as entries:
+        for entry in entries:
+            try:
+                if entry.is_file() and os.access(entry.path, os.X_OK):
+                    commands.append(entry.name)
+            except OSError:
+                continue
+    return commands
+
+def read_json_cache(cache_file, version):
+    """The fields of a cache file written by write_json_cache, or {} if it
+    is missing, unreadable or from another version."""
+    try:
+        with open(cache_file) as f:
+            import json
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if isinstance(data, dict) and data.get("version") == version:
+        return data
+    return {}
+
+def write_json_cache(cache_file, version, **fields):
+    """Writes fields as a versioned JSON cache file, atomically: readers see
+    the old file or the new one, never a partial write. Returns whether it
+    was written."""
+    tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        with open(tmp_file, "w") as f:
+            import json
+            json.dump({"version": version, **fields}, f, separators=(",", ":"))
+        os.replace(tmp_file, cache_file)
+        return True
+    except OSError:
+        try:
+            os.unlink(tmp_file)
+        except OSError:
+            pass
+        return False
+
+class PathIndex:
+    """On-disk cache of the executables in each PATH directory, keyed by the
+    directory path and validated against its mtime."""
+
+    def __init__(self, cache_file=None):
+        self.cache_file = cache_file or default_path_index_file()
+        self.dirs = {}
+        self.dirty = False
+        self.rescanned = 0
+        self._load()
+
+    def _load(self):
+        self.dirs = read_json_cache(self.cache_file, PATH_INDEX_VERSION).get("dirs", {})
+
+    def commands(self, path_dir):
+        try:
+            mtime = os.stat(path_dir).st_mtime_ns
+        except OSError:
+            return []
+        cached = self.dirs.get(path_dir)
+        if (cached and cached.get("mtime") == mtime
+                and cached.get("scanned", 0) - mtime > RACY_MTIME_NS):
+            return cached["commands"]
+
+        commands = scan_path_dir(path_dir)
+        self.dirs[path_dir] = {"mtime": mtime, "scanned": time.time_ns(), "commands": commands}
+        self.dirty = True
+        self.rescanned += 1
+        return commands
+
+    def save(self):
+        if self.dirty and write_json_cache(self.cache_file, PATH_INDEX_VERSION, dirs=self.dirs):
+            self.dirty = False
+
+
+class DirListingCache:
+    """LRU cache of sorted directory listings, validated by directory mtime.
 
-        for char in prefix:
-            if char not in node.children:
-                return [] 
-            node = node.children[char]
-        
-        
-        results = []
-        self._dfs(node, prefix, results)
-        return results
+    Whether each entry is a directory comes from scandir's d_type, so only
+    symlinks cost an extra stat."""
 
-    def _dfs(self, node, current_prefix, results):
-        if node.is_end_of_word:
-            results.append(current_prefix)
-        for char in sorted(node.children.keys()):
-            self._dfs(node.children[char], current_prefix + char, results)
+    def __init__(self, max_dirs=64):
+        self.max_dirs = max_dirs
+        self._listings = OrderedDict()
+        self._lock = threading.Lock()
 
+    def listing(self, path):
+        key = os.path.abspath(path)
+        mtime = os.stat(key).st_mtime_ns
+        with self._lock:
+            cached = self._listings.get(key)
+            if cached is not None and cached[0] == mtime:
+                self._listings.move_to_end(key)
+                return cached[1], cached[2]
+
+        entries = []
+        with os.scandir(key) as it:
+            for entry in it:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                entries.append((entry.name, is_dir))
+        entries.sort()
+        names = [name for name, _ in entries]
+        dir_flags = [is_dir for _, is_dir in entries]
+
+        if time.time_ns() - mtime > RACY_MTIME_NS:
+            with self._lock:
+                self._listings[key] = (mtime, names, dir_flags)
+                self._listings.move_to_end(key)
+                while len(self._listings) > self.max_dirs:
+                    self._listings.popitem(last=False)
+        return names, dir_flags
+
+    def matching(self, path, prefix, limit=None):
+        """(name, is_dir) pairs for the entries starting with prefix, at most
+        limit of them, and the total number of such entries."""
+        names, dir_flags = self.listing(path)
+        start = bisect.bisect_left(names, prefix)
+        end = bisect.bisect_left(names, prefix + "\U0010ffff", start)
+        stop = end if limit is None else min(end, start + limit)
+        return [(names[i], dir_flags[i]) for i in range(start, stop)], end - start
+
+    def common_prefix(self, path, prefix):
+        names, _ = self.listing(path)
+        start = bisect.bisect_left(names, prefix)
+        end = bisect.bisect_left(names, prefix + "\U0010ffff", start)
+        if start == end:
+            return prefix
+        return os.path.commonprefix([names[start], names[end - 1]])
+
+    def clear(self):
+        with self._lock:
+            self._listings.clear()
 
 
 class ShellCompleter:
-    def __init__(self):
+    # Most matches gathered and shown for one TAB; the rest are only counted.
+    completion_limit = int(os.environ.get("SEASHELL_COMPLETION_LIMIT", "100"))
+    more = 0
+    # How long a command-name completion waits for a background build before
+    # answering from whatever part of the Trie is ready.
+    build_timeout = 0.25
+
+    def __init__(self, path_index=None, background=False, lazy=False):
+        """background builds the command Trie on a thread; lazy (which
+        implies background) waits to start that build until the first
+        command-name completion needs it."""
         self.command_trie = Trie()
-        self._populate_command_trie()
+        self.path_index = path_index
+        self.dir_cache = DirListingCache()
+        self.arg_completer = None
+        self._trie_lock = threading.Lock()
+        self._trie_ready = threading.Event()
+        self._build_started = False
+        if lazy:
+            pass
+        elif background:
+            self._start_build()
+        else:
+            self._build_started = True
+            self._populate_command_trie()
+
+    def _start_build(self):
+        with self._trie_lock:
+            if self._build_started:
+                return
+            self._build_started = True
+        threading.Thread(target=self._populate_command_trie, name="trie-builder", daemon=True).start()
+
+    def wait_until_ready(self, timeout=None):
+        if not self._build_started:
+            self._start_build()
+        return self._trie_ready.wait(timeout)
 
     def _populate_command_trie(self):
-        builtins = {"echo", "exit", "type", "pwd", "cd", "history"}
-        for cmd in builtins:
-            self.command_trie.insert(cmd)
+        try:
+            self._build_command_trie()
+        finally:
+            self._trie_ready.set()
+
+    def _build_command_trie(self):
+        if self.path_index is None:
+            self.path_index = PathIndex()
+
+        builtin_names = set(SHELL_KEYWORDS).union(builtin_registry.names())
+        with self._trie_lock:
+            for cmd in builtin_names:
+                self.command_trie.insert(cmd)
 
         paths = os.environ.get("PATH", "").split(os.pathsep)
-        seen_files = set(builtins)
+        seen_files = set(builtin_names)
         seen_paths = set()
 
         for p in paths:
-            if p in seen_paths or not os.path.isdir(p):
+            if not p or p in seen_paths:
                 continue
             seen_paths.add(p)
 
             try:
-                with os.scandir(p) as entries:
-                    for entry in entries:
-                        if entry.is_file() and entry.name not in seen_files:
-                            if os.access(entry.path, os.X_OK):
-                                self.command_trie.insert(entry.name)
-                                seen_files.add(entry.name)
+                commands = self.path_index.commands(p)
             except OSError:
                 continue
+            with self._trie_lock:
+                for name in commands:
+                    if name not in seen_files:
+                        self.command_trie.insert(name)
+                        seen_files.add(name)
+
+        self.path_index.save()
+
+    def display_matches(self, substitution, matches, _longest_match_length):
+        shown = [m.strip() for m in matches if not (self.more and m == substitution)]
+        print()
+        line = "  ".join(shown)
+        if self.more:
+            line += f"  ... and {self.more} more"
+        print(line)
+        import readline
+        sys.stdout.write("$ " + readline.get_line_buffer())
+        sys.stdout.flush()
+
+    def add_command(self, name):
+        with self._trie_lock:
+            self.command_trie.insert(name)
+        command_hash.forget(name)
+
+    def remove_command(self, name, path_dir):
+        command_hash.forget(name)
+        if is_builtin(name):
+            return
+        for p in os.environ.get("PATH", "").split(os.pathsep):
+            if p and p != path_dir:
+                candidate = os.path.join(p, name)
+                if os.path.isfile(candidate) and os.access(candidate, os.X_OK):
+                    return
+        with self._trie_lock:
+            self.command_trie.remove(name)
+
+    def argument_completer(self):
+        if self.arg_completer is None:
+            import shell_argcomplete
+            self.arg_completer = shell_argcomplete.ArgumentCompleter(
+                lambda name: command_hash.lookup(name, count=False))
+        return self.arg_completer
+
+    def find_completions(self, text, is_command, words=()):
+        """At most completion_limit matches for text; self.more is set to the
+        number of further matches that were left out. words are the words
+        before text in its command, which select subcommands and flags from
+        the command's argument index; without one, file names complete."""
+        started = shell_stats.start()
+        limit = self.completion_limit
+        arguments = None
+        if words and not is_command:
+            arguments = self.argument_completer().complete(words, text)
+        if arguments is not None:
+            total = len(arguments)
+            if total > limit:
+                self.common = os.path.commonprefix(arguments)
+            matches = [a + " " for a in arguments[:limit]]
+        elif is_command:
+            self.wait_until_ready(self.build_timeout)
+            with self._trie_lock:
+                raw_matches = list(itertools.islice(self.command_trie.iter_matches(text), limit))
+                total = self.command_trie.count_matches(text)
+                if total > len(raw_matches):
+                    self.common = self.command_trie.common_prefix(text)
+            matches = [c + " " for c in raw_matches]
+        else:
+            dirname, partial = os.path.split(text)
+            search_dir = dirname if dirname else "."
+            try:
+                entries, total = self.dir_cache.matching(search_dir, partial, limit)
+                if total > len(entries):
+                    common = self.dir_cache.common_prefix(search_dir, partial)
+                    self.common = os.path.join(dirname, common) if dirname else common
+            except OSError:
+                entries, total = [], 0
+            matches = []
+            for filename, is_dir in entries:
+                display_name = os.path.join(dirname, filename) if dirname else filename
+                matches.append(display_name + ("/" if is_dir else " "))
+
+        self.more = total - len(matches)
+        shell_stats.stop("complete", started)
+        return matches
 
     def complete(self, text, state):
         if state == 0:
-            begidx = readline.get_begidx()
-            is_command = (begidx == 0)
-
-            self.matches = []
+            import readline
+            words = command_words(readline.get_line_buffer()[:readline.get_begidx()])
+            self.matches = self.find_completions(text, not words, words)
+            if self.more:
+                # readline inserts the common prefix of what we return, which
+                # for a truncated list may be longer than the real one. Adding
+                # the true common prefix of all matches keeps it honest.
+                self.matches.append(self.common)
 
-            if is_command:
-                raw_matches = self.command_trie.find_matches(text)
-                self.matches = [c + " " for c in raw_matches]
-            else:
-                dirname, partial = os.path.split(text)
-                search_dir = dirname if dirname else "."
-                
-                if os.path.isdir(search_dir):
-                    try:
-                        for filename in os.listdir(search_dir):
-                            if filename.startswith(partial):
-                                full_path = os.path.join(search_dir, filename)
-                                display_name = os.path.join(dirname, filename) if dirname else filename
-                                
-                                if os.path.isdir(full_path):
-                                    display_name += "/"
-                                else:
-                                    display_name += " " 
-                                self.matches.append(display_name)
-                    except OSError:
-                        pass
-                self.matches.sort()
-        
         try:
             return self.matches[state]
         except IndexError:
             return None
 
 
-path_dirs = os.environ["PATH"].split(os.pathsep)
+# The word being completed belongs to the command after the last of these.
+# The & of a >&/<& fd duplication (2>&1, >&2) separates nothing.
+# Patterns rather than compiled regexes: re keeps its own cache of those.
+_COMMAND_SEPARATOR = r"\|\||&&|\||;|(?<![<>])&|\$\(|`"
+
+_REDIRECT_WORD = r"\d*(?:<<<|>>|>&|<&|>|<)"
+
+def command_words(line):
+    """The words of the last command in line, the text before the cursor,
+    without its redirections."""
+    import re
+    words = []
+    target = False
+    for word in re.split(_COMMAND_SEPARATOR, line)[-1].split():
+        redirect = re.match(_REDIRECT_WORD, word)
+        if target:
+            target = False
+        elif redirect:
+            # A bare operator (2>, <) takes the next word as its target.
+            target = redirect.end() == len(word)
+        else:
+            words.append(word)
+    if target:
+        # The word being completed is a redirection target: a file name.
+        words.append(word)
+    while words and words[0] in SHELL_KEYWORDS:
+        words = words[2:] if words[0] == "deadline" else words[1:]
+    return words
+
+
+class CommandHash:
+    """Bash-style table of resolved command locations with hit counts.
+
+    The table is dropped whenever PATH changes, and a single entry can be
+    dropped with forget() when the cached file has gone away."""
+
+    def __init__(self):
+        self.table = {}
+        self._path = None
+
+    def _check_path(self):
+        path = os.environ.get("PATH", "")
+        if path != self._path:
+            self.table.clear()
+            self._path = path
+
+    def lookup(self, name, count=True):
+        if os.sep in name:
+            # Not checked for being executable: spawning it reports that
+            # with the right message and status (126, not 127).
+            return name if os.path.exists(name) else None
+
+        self._check_path()
+        entry = self.table.get(name)
+        if entry is None:
+            import shutil
+            location = shutil.which(name)
+            if location is None:
+                return None
+            entry = self.table[name] = [location, 0]
+        if count:
+            entry[1] += 1
+        return entry[0]
+
+    def forget(self, name):
+        self.table.pop(name, None)
+
+    def clear(self):
+        self.table.clear()
+
+    def items(self):
+        self._check_path()
+        return sorted(self.table.items())
+
+command_hash = CommandHash()
+
+class FinishedCommand:
+    """Stands in for a child process when a command ended without spawning
+    one (e.g. command not found), so callers can always wait() for a status."""
+
+    def __init__(self, returncode):
+        self.returncode = returncode
+
+    def wait(self, timeout=None):
+        return self.returncode
+
+class SpawnedProcess:
+    """Popen-like handle for a child started with os.posix_spawn."""
+
+    def __init__(self, pid, args):
+        self.pid = pid
+        self.args = args
+        self.returncode = None
+        self.rusage = None
+
+    def poll(self):
+        if self.returncode is None:
+            pid, status, rusage = os.wait4(self.pid, os.WNOHANG)
+            if pid:
+                self._set_status(status, rusage)
+        return self.returncode
+
+    def wait(self):
+        if self.returncode is None:
+            try:
+                _, status, rusage = os.wait4(self.pid, 0)
+            except ChildProcessError:
+                # Already reaped elsewhere; the status is gone.
+                self.returncode = 0
+            else:
+                self._set_status(status, rusage)
+        return self.returncode
+
+    def _set_status(self, status, rusage):
+        self.returncode = os.waitstatus_to_exitcode(status)
+        self.rusage = rusage
+
+SPAWN_BACKENDS = ("auto", "posix_spawn", "popen")
+spawn_backend = os.environ.get("SEASHELL_SPAWN", "auto")
+
+def set_spawn_backend(name):
+    global spawn_backend
+    if name not in SPAWN_BACKENDS:
+        raise ValueError(f"unknown spawn backend {name!r} (choose from {', '.join(SPAWN_BACKENDS)})")
+    if name == "posix_spawn" and not hasattr(os, "posix_spawn"):
+        raise ValueError("posix_spawn is not available on this platform")
+    spawn_backend = name
+
+def _as_fd(dest):
+    if dest is None or isinstance(dest, int):
+        return dest
+    return dest.fileno()
+
+def _spawn_file_actions(stdin, stdout, stderr):
+    """dup2 actions that put the given fds on 0, 1 and 2, or None when one
+    source fd would be overwritten by an earlier action (Popen handles it)."""
+    actions = []
+    replaced = set()
+    for target, dest in enumerate((stdin, stdout, stderr)):
+        fd = _as_fd(dest)
+        if fd is None or fd == target:
+            continue
+        if fd in replaced:
+            return None
+        actions.append((os.POSIX_SPAWN_DUP2, fd, target))
+        replaced.add(target)
+    return actions
+
+def _spawn_environ():
+    """The environment to hand os.posix_spawn. os.environ decodes each
+    entry as posix_spawn iterates it, only for posix_spawn to encode it
+    again; the dict behind it already holds the encoded bytes, and
+    os.environ's setters keep it current."""
+    data = getattr(os.environ, "_data", None)
+    return data if isinstance(data, dict) else os.environ
+
+def _spawn(parts, location, stdin, stdout, stderr, process_group):
+    import signal
+    if spawn_backend != "popen" and hasattr(os, "posix_spawn"):
+        file_actions = _spawn_file_actions(stdin, stdout, stderr)
+        if file_actions is not None:
+            # Python ignores SIGPIPE, and an interactive shell SIGTTOU; like
+            # Popen, give the child the default actions back.
+            group = {} if process_group is None else {"setpgroup": process_group}
+            pid = os.posix_spawn(location, parts, _spawn_environ(), file_actions=file_actions,
+                                 setsigdef=(signal.SIGPIPE, signal.SIGTTOU), **group)
+            return SpawnedProcess(pid, parts)
+    import subprocess
+    group = {}
+    if process_group is not None:
+        if sys.version_info >= (3, 11):
+            group["process_group"] = process_group
+        else:
+            group["preexec_fn"] = lambda: os.setpgid(0, process_group)
+    return subprocess.Popen(parts, executable=location, stdin=stdin, stdout=stdout, stderr=stderr, **group)
 
-def display_matches(_, matches, _longest_match_length):
-    print() 
-    print("  ".join([m.strip() for m in matches])) 
-    sys.stdout.write("$ " + readline.get_line_buffer())
+def spawn_command(parts, stdin, stdout, stderr, process_group=None):
+    """Starts an external command with the given fds on 0, 1 and 2.
+    process_group is the pgid the child joins, 0 to lead a new group, or
+    None to stay in the shell's."""
+    command = parts[0]
+    started = shell_stats.start()
+    location = command_hash.lookup(command)
+    shell_stats.stop("resolve", started)
+    if location is None:
+        raise FileNotFoundError(command)
+    # Builtins write through sys.stdout; flush it so their output is not
+    # overtaken by the child writing to the same fd.
     sys.stdout.flush()
+    started = shell_stats.start()
+    try:
+        proc = _spawn(parts, location, stdin, stdout, stderr, process_group)
+    except FileNotFoundError:
+        # The hashed file was removed or moved since it was cached.
+        command_hash.forget(command)
+        retry = command_hash.lookup(command, count=False)
+        if retry is None or retry == location:
+            raise
+        proc = _spawn(parts, retry, stdin, stdout, stderr, process_group)
+    shell_stats.stop("spawn", started)
+    shell_stats.count("external")
+    return proc
 
-def run_command_segment(parts, input_fd, output_fd, error_fd):   
-        stdout_dest = output_fd
-        stderr_dest = error_fd
-        should_close_stdout = False
-        should_close_stderr = False
-
-        # Handle Redirection
-        operator_indices = [i for i, part in enumerate(parts) if part in (">", ">>", "1>","1>>", "2>", "2>>")]
-        for index in reversed(operator_indices):
-            operator = parts[index]
-            if index + 1 >= len(parts):
-                print("Syntax error: no file specified for redirection")
-                continue
-            filename = parts[index + 1]
-            mode = "w"
-            if ">>" in operator:
-                    mode = "a"
+class ChildReaper:
+    """Collects background children as they exit, off the main thread.
+
+    Each child gets a pidfd registered with a selector, so the reaper thread
+    sleeps until one of them actually exits and then wait4()s it, keeping
+    its exit status and rusage on the process object. Without pidfds the
+    children are polled with WNOHANG instead."""
+
+    poll_interval = 0.05
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = []
+        self._polled = []
+        self._done = {}
+        self._selector = None
+        self._thread = None
+
+    def _start(self):
+        import selectors
+        self._selector = selectors.DefaultSelector()
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_r, False)
+        self._selector.register(self._wake_r, selectors.EVENT_READ, None)
+        self._thread = threading.Thread(target=self._run, name="child-reaper", daemon=True)
+        self._thread.start()
+
+    def watch(self, proc):
+        try:
+            pidfd = os.pidfd_open(proc.pid)
+        except (AttributeError, OSError):
+            pidfd = None
+        with self._lock:
+            self._done[proc.pid] = threading.Event()
+            self._pending.append((proc, pidfd))
+            if self._thread is None:
+                self._start()
+        os.write(self._wake_w, b"x")
+
+    def wait(self, proc, timeout=None):
+        """proc's status, or None if it is still running after timeout
+        seconds."""
+        event = self._done.get(proc.pid)
+        if event is None:
+            return proc.wait()
+        event.wait(timeout)
+        return proc.returncode
+
+    def _reap(self, proc):
+        try:
+            pid, status, rusage = os.wait4(proc.pid, os.WNOHANG)
+        except ChildProcessError:
+            pid, status, rusage = proc.pid, 0, None
+        if not pid:
+            return False
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        proc.rusage = rusage
+        self._done.pop(proc.pid).set()
+        return True
+
+    def _run(self):
+        import selectors
+        while True:
+            timeout = self.poll_interval if self._polled else None
+            for key, _ in self._selector.select(timeout):
+                if key.data is None:
+                    try:
+                        os.read(self._wake_r, 4096)
+                    except BlockingIOError:
+                        pass
+                elif self._reap(key.data):
+                    self._selector.unregister(key.fd)
+                    os.close(key.fd)
+
+            with self._lock:
+                pending, self._pending = self._pending, []
+            for proc, pidfd in pending:
+                if pidfd is None:
+                    self._polled.append(proc)
+                else:
+                    self._selector.register(pidfd, selectors.EVENT_READ, proc)
+            self._polled = [proc for proc in self._polled if not self._reap(proc)]
+
+child_reaper = ChildReaper()
+
+class Job:
+    def __init__(self, job_id, command, procs):
+        self.job_id = job_id
+        self.command = command
+        self.procs = procs
+
+    def done(self):
+        return all(proc.returncode is not None for proc in self.procs)
+
+    @property
+    def returncode(self):
+        return self.procs[-1].returncode if self.procs else 0
+
+    @property
+    def pgid(self):
+        """The process group of the job's external stages, led by the first
+        of them, or None if it has none."""
+        for proc in self.procs:
+            if getattr(proc, "pid", None) is not None:
+                return proc.pid
+        return None
+
+    def wait(self, foreground=False, has_terminal=False):
+        """Waits for every stage and returns the job's status. In the
+        foreground Ctrl-C is passed on to the job's group, and while
+        has_terminal says the group holds the terminal a Ctrl-Z is undone,
+        as for pipelines started there; otherwise Ctrl-C stops the wait."""
+        import signal
+        pgid = self.pgid
+        timeout = STAGE_POLL_INTERVAL if has_terminal else None
+        for proc in self.procs:
+            while True:
+                try:
+                    if getattr(proc, "pid", None) is not None:
+                        done = child_reaper.wait(proc, timeout) is not None
+                    else:
+                        done = proc.wait(timeout) is not None
+                except KeyboardInterrupt:
+                    if not foreground:
+                        raise
+                    _signal_stages(self.procs, pgid, signal.SIGINT)
+                    continue
+                if done:
+                    break
+                _resume_stopped(pgid)
+        return self.returncode
+
+    def state(self):
+        if not self.done():
+            return "Running"
+        status = self.returncode
+        if status is not None and status < 0:
+            # Killed by signal -status: named as other shells name it.
+            import signal
+            return signal.strsignal(-status) or f"Exit {128 - status}"
+        return "Done" if status == 0 else f"Exit {status}"
+
+class JobTable:
+    def __init__(self):
+        self.jobs = {}
+
+    def add(self, command, procs):
+        job_id = max(self.jobs, default=0) + 1
+        job = self.jobs[job_id] = Job(job_id, command, procs)
+        for proc in procs:
+            if getattr(proc, "pid", None) is not None:
+                child_reaper.watch(proc)
+        return job
+
+    def get(self, spec=None):
+        if spec is None:
+            return self.jobs[max(self.jobs)] if self.jobs else None
+        if spec.startswith("%"):
             try:
-                f = open(filename, mode)
-            except IOError as e:
-                print(f"Error opening file {filename}: {e}")
-                continue
+                return self.jobs.get(int(spec[1:]))
+            except ValueError:
+                return None
+        for job in self.jobs.values():
+            if any(str(getattr(proc, "pid", "")) == spec for proc in job.procs):
+                return job
+        return None
 
-            if operator in ("2>", "2>>"):
-                if should_close_stderr: stderr_dest.close() 
-                stderr_dest = f
-                should_close_stderr = True
-            else:
-                if should_close_stdout: stdout_dest.close()
-                stdout_dest = f
-                should_close_stdout = True
-            del parts[index:index + 2]
+    def remove(self, job):
+        self.jobs.pop(job.job_id, None)
 
-        if not parts: return None
-        command = parts[0]
-        args = parts[1:]
+    def format(self, job, long=False):
+        current = "+" if job.job_id == max(self.jobs, default=0) else " "
+        line = f"[{job.job_id}]{current}  {job.state():<24}{job.command}"
+        if long:
+            for proc in job.procs:
+                rusage = getattr(proc, "rusage", None)
+                pid = getattr(proc, "pid", "-")
+                usage = f"user {rusage.ru_utime:.3f}s sys {rusage.ru_stime:.3f}s maxrss {rusage.ru_maxrss}KB" if rusage else ""
+                line += f"\n      {pid}  {usage}"
+        return line
+
+    def notify(self, stream):
+        for job in sorted(self.jobs.values(), key=lambda j: j.job_id):
+            if job.done():
+                print(self.format(job), file=stream)
+                self.remove(job)
+
+jobs = JobTable()
+
+def builtin_echo(args, stdin, stdout, stderr):
+    stdout.write(" ".join(args) + "\n")
+    return 0
+
+def builtin_exit(args, stdin, stdout, stderr):
+    try:
+        sys.exit(int(args[0]) if args else 0)
+    except ValueError:
+        print(f"exit: {args[0]}: numeric argument required", file=stderr)
+        sys.exit(2)
+
+def builtin_type(args, stdin, stdout, stderr):
+    target = args[0] if args else ""
+    if not target: return 0
+
+    if is_builtin(target):
+        print(f"{target} is a shell builtin", file=stdout)
+        return 0
+    location = command_hash.lookup(target, count=False)
+    if location and os.access(location, os.X_OK) and not os.path.isdir(location):
+        print(f"{target} is {location}", file=stdout)
+        return 0
+    print(f"{target}: not found", file=stderr)
+    return 1
 
-        safe_stdout = stdout_dest if stdout_dest else sys.stdout
-        safe_stderr = stderr_dest if stderr_dest else sys.stderr
+def builtin_pwd(args, stdin, stdout, stderr):
+    stdout.write(os.getcwd() + "\n")
+    return 0
 
-        def write_to_output(text, dest):
-            if isinstance(dest, int):
-                with os.fdopen(dest, 'w') as f:
-                    f.write(str(text) + "\n")
+# Persistent history store (shell_history.HistoryFile), set by interactive
+# sessions. Without it, history shows this session's readline list.
+command_history = None
+
+def builtin_history(args, stdin, stdout, stderr):
+    mode = None
+    pattern = ""
+    if args and args[0] in ("-s", "-p"):
+        if len(args) < 2:
+            print("usage: history [-s text | -p prefix] [n]", file=stderr)
+            return 2
+        mode, pattern, args = args[0], args[1], args[2:]
+    limit = None
+    if args:
+        try:
+            limit = int(args[0])
+        except ValueError:
+            pass
+
+    if command_history is None:
+        import readline
+        history_length = readline.get_current_history_length()
+        entries = [(i, readline.get_history_item(i)) for i in range(1, history_length + 1)]
+        if mode == "-s":
+            entries = [(i, line) for i, line in entries if pattern in line]
+        elif mode == "-p":
+            entries = [(i, line) for i, line in entries if line.startswith(pattern)]
+    elif mode == "-s":
+        entries = command_history.search(pattern)
+    elif mode == "-p":
+        entries = command_history.prefix(pattern)
+    else:
+        # Only the requested tail of the file is decoded.
+        total = len(command_history)
+        entries = command_history.entries(total - limit if limit is not None else 0)
+        limit = None
+
+    if limit is not None:
+        entries = entries[-limit:] if limit > 0 else []
+    for i, line in entries:
+        stdout.write(f"{i}  {line}\n")
+    return 0
+
+def builtin_hash(args, stdin, stdout, stderr):
+    status = 0
+    if not args:
+        entries = command_hash.items()
+        if entries:
+            print("hits\tcommand", file=stdout)
+            for name, (location, hits) in entries:
+                print(f"{hits:4d}\t{location}", file=stdout)
+        else:
+            print("hash: hash table empty", file=stdout)
+    elif args[0] == "-r":
+        command_hash.clear()
+    elif args[0] == "-t":
+        for name in args[1:]:
+            entry = command_hash.table.get(name)
+            if entry:
+                print(entry[0], file=stdout)
             else:
-                print(text, file=dest)
+                print(f"hash: {name}: not found", file=stderr)
+                status = 1
+    else:
+        for name in args:
+            if command_hash.lookup(name, count=False) is None:
+                print(f"hash: {name}: not found", file=stderr)
+                status = 1
+    return status
+
+def builtin_cd(args, stdin, stdout, stderr):
+    path = os.path.expanduser(args[0]) if args else os.path.expanduser("~")
+    try:
+        os.chdir(path)
+    except OSError as e:
+        print(f"cd: {args[0] if args else path}: {e.strerror}", file=stderr)
+        return 1
+    return 0
+
+def builtin_jobs(args, stdin, stdout, stderr):
+    long = "-l" in args
+    for job in sorted(list(jobs.jobs.values()), key=lambda j: j.job_id):
+        print(jobs.format(job, long), file=stdout)
+        if job.done():
+            jobs.remove(job)
+    return 0
+
+def builtin_wait(args, stdin, stdout, stderr):
+    if not args:
+        status = 0
+        for job in list(jobs.jobs.values()):
+            status = job.wait()
+            jobs.remove(job)
+        return status
+
+    status = 0
+    for spec in args:
+        job = jobs.get(spec)
+        if job is None:
+            print(f"wait: {spec}: no such job", file=stderr)
+            status = 127
+            continue
+        status = job.wait()
+        jobs.remove(job)
+    return status
 
-        if command == "exit":
-            sys.exit(0)
+PARALLEL_USAGE = "usage: parallel [-j N] [-k] [--] command [args with {}] [::: items...]"
 
-        elif command == "echo":
-            write_to_output(" ".join(args), safe_stdout)
-            if should_close_stdout: stdout_dest.close()
+def _parallel_job(template, item, stderr, children):
+    import signal
+    parts = [part.replace("{}", item) for part in template]
+    if parts == template:
+        parts.append(item)
+    if children is not None and children.signalled is not None:
+        # The pipeline was interrupted or ran out of time: start nothing more.
+        return b"", 128 + children.signalled
+
+    r, w = os.pipe()
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    try:
+        proc = run_command_segment(parts, devnull, w, stderr,
+                                   process_group=children.process_group() if children else None)
+    finally:
+        os.close(w)
+        os.close(devnull)
+    if children is not None:
+        children.add(proc)
+    try:
+        with os.fdopen(r, "rb") as output:
+            data = output.read()
+        status = proc.wait() if proc else 0
+    finally:
+        if children is not None:
+            children.discard(proc)
+    if status == -signal.SIGINT and children is not None:
+        # Ctrl-C went to the process group the job is in, not to the shell.
+        children.signalled = signal.SIGINT
+    return data, 128 - status if status < 0 else status
+
+def builtin_parallel(args, stdin, stdout, stderr):
+    import signal
+    max_jobs = os.cpu_count() or 1
+    keep_order = False
+    i = 0
+    while i < len(args) and args[i].startswith("-"):
+        if args[i] == "--":
+            i += 1
+            break
+        elif args[i] == "-k":
+            keep_order = True
+        elif args[i] == "-j" and i + 1 < len(args):
+            i += 1
+            try:
+                max_jobs = max(1, int(args[i]))
+            except ValueError:
+                print(f"parallel: -j: {args[i]}: invalid number", file=stderr)
+                return 2
+        else:
+            print(PARALLEL_USAGE, file=stderr)
+            return 2
+        i += 1
+
+    template = args[i:]
+    if ":::" in template:
+        split = template.index(":::")
+        template, items = template[:split], template[split + 1:]
+    else:
+        items = [line.rstrip("\n") for line in stdin if line.strip()]
+    if not template:
+        print(PARALLEL_USAGE, file=stderr)
+        return 2
+
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    out = getattr(stdout, "buffer", None)
+    def emit(data):
+        if out is not None:
+            stdout.flush()
+            out.write(data)
+            out.flush()
+        else:
+            stdout.write(data.decode(errors="replace"))
+
+    failed = 0
+    children = stage_children()
+    with ThreadPoolExecutor(max_workers=max_jobs) as pool:
+        futures = {pool.submit(_parallel_job, template, item, stderr, children): n
+                   for n, item in enumerate(items)}
+        ready = {}
+        next_index = 0
+        for future in as_completed(futures):
+            data, status = future.result()
+            if status != 0:
+                failed += 1
+            if not keep_order:
+                emit(data)
+                continue
+            # Buffer out-of-order results and emit the finished prefix.
+            ready[futures[future]] = data
+            while next_index in ready:
+                emit(ready.pop(next_index))
+                next_index += 1
+
+    if children is not None and children.signalled == signal.SIGINT:
+        return 128 + signal.SIGINT
+    if failed:
+        print(f"parallel: {failed} of {len(items)} jobs failed", file=stderr)
+    # Like GNU parallel: the exit status is the number of failed jobs.
+    return min(failed, 101)
+
+builtin_parallel.spawns = True
+
+def builtin_fg(args, stdin, stdout, stderr):
+    import signal
+    spec = args[0] if args else None
+    job = jobs.get(spec)
+    if job is None:
+        print(f"fg: {spec or 'current'}: no such job", file=stderr)
+        return 1
+    print(job.command, file=stdout)
+    stdout.flush()
+    # Like a pipeline started in the foreground, the job gets the terminal
+    # while it runs, so Ctrl-C and Ctrl-Z reach it rather than the shell.
+    pgid = job.pgid
+    has_terminal = pgid is not None and _give_terminal(pgid)
+    try:
+        status = job.wait(foreground=True, has_terminal=has_terminal)
+    finally:
+        if has_terminal:
+            _take_terminal()
+    jobs.remove(job)
+    if status == -signal.SIGINT:
+        # As for a pipeline run in the foreground, Ctrl-C abandons the rest
+        # of the command line.
+        raise KeyboardInterrupt
+    return 128 - status if status < 0 else status
+
+class BuiltinRegistry:
+    """Builtin commands by name.
+
+    A builtin is a callable (args, stdin, stdout, stderr) -> status, or a
+    "module:attr" string naming one, which is imported the first time the
+    builtin runs. Other packages can add builtins through the
+    "seashell.builtins" entry point group; those are discovered the first
+    time the registry is consulted and never replace a builtin of the same
+    name. A builtin may carry an accepts(args) function: when it returns
+    False for a call, the external command of the same name runs instead.
+    One that starts processes of its own sets spawns = True: it then always
+    runs on a thread, supervised like any pipeline stage, and registers its
+    children with stage_children() so deadlines and Ctrl-C reach them."""
+
+    entry_point_group = "seashell.builtins"
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._discovered = False
+
+    def register(self, name, target):
+        with self._lock:
+            self._entries[name] = target
+
+    def unregister(self, name):
+        with self._lock:
+            self._entries.pop(name, None)
+
+    def _discover(self):
+        with self._lock:
+            if self._discovered:
+                return
+            self._discovered = True
+            for name, value in self._scan_entry_points():
+                self._entries.setdefault(name, value)
+
+    def _scan_entry_points(self):
+        """(name, "module:attr") pairs from the entry_points.txt of every
+        installed distribution on sys.path. Reading those files directly
+        takes about a millisecond; importing importlib.metadata alone costs
+        tens, on every shell start."""
+        header = f"[{self.entry_point_group}]"
+        for entry in sys.path:
+            directory = entry or "."
+            try:
+                names = os.listdir(directory)
+            except OSError:
+                continue
+            for name in names:
+                if not name.endswith((".dist-info", ".egg-info")):
+                    continue
+                try:
+                    with open(os.path.join(directory, name, "entry_points.txt")) as f:
+                        text = f.read()
+                except OSError:
+                    continue
+                if header not in text:
+                    continue
+                in_group = False
+                for line in text.splitlines():
+                    line = line.strip()
+                    if line.startswith("["):
+                        in_group = line == header
+                    elif in_group and "=" in line:
+                        key, _, value = line.partition("=")
+                        # Drop any [extras] after the object reference.
+                        yield key.strip(), value.split()[0]
+
+    def __contains__(self, name):
+        self._discover()
+        return name in self._entries
+
+    def names(self):
+        self._discover()
+        with self._lock:
+            return list(self._entries)
+
+    def get(self, name):
+        """The builtin's callable, importing it if needed, or None. A
+        builtin that fails to import is reported and dropped, so the name
+        falls through to PATH from then on."""
+        self._discover()
+        target = self._entries.get(name)
+        if target is None or callable(target):
+            return target
+        module_name, _, attr = target.partition(":")
+        try:
+            import importlib
+            func = importlib.import_module(module_name)
+            for part in attr.split("."):
+                func = getattr(func, part)
+        except Exception as e:
+            print(f"seashell: {name}: cannot load builtin {target}: {e}", file=sys.stderr)
+            self.unregister(name)
             return None
-        
-        elif command == "type":
-            target = args[0] if args else ""
-            if not target: return None
+        with self._lock:
+            self._entries[name] = func
+        return func
 
-            if target in ("type", "echo", "exit", "pwd", "cd", "history"):
-                print(f"{target} is a shell builtin", file=safe_stdout)
-            else:
-                location = shutil.which(target)
-                if location:
-                    print(f"{target} is {location}", file=safe_stdout)
-                else:
-                    print(f"{target}: not found", file=safe_stderr)
-            
-            if should_close_stdout: stdout_dest.close()
+    def lookup(self, name, args):
+        """The builtin to run for name with these args, or None to run an
+        external command."""
+        func = self.get(name)
+        if func is None:
+            return None
+        accepts = getattr(func, "accepts", None)
+        if accepts is not None and not accepts(args):
             return None
+        return func
+
+builtin_registry = BuiltinRegistry()
+for _name, _func in (
+    ("echo", builtin_echo),
+    ("exit", builtin_exit),
+    ("type", builtin_type),
+    ("pwd", builtin_pwd),
+    ("history", builtin_history),
+    ("hash", builtin_hash),
+    ("cd", builtin_cd),
+    ("jobs", builtin_jobs),
+    ("wait", builtin_wait),
+    ("fg", builtin_fg),
+    ("parallel", builtin_parallel),
+    ("stats", "shell_stats:builtin_stats"),
+    # Small coreutils run in-process to save a fork in tight scripts.
+    ("true", "shell_coreutils:builtin_true"),
+    ("false", "shell_coreutils:builtin_false"),
+    ("basename", "shell_coreutils:builtin_basename"),
+    ("cat", "shell_coreutils:builtin_cat"),
+):
+    builtin_registry.register(_name, _func)
+
+# Words handled by the parser side of the shell rather than as builtins
+# (time and deadline prefix a whole pipeline), listed for completion and type.
+SHELL_KEYWORDS = ("time", "deadline")
+
+def is_builtin(name):
+    return name in SHELL_KEYWORDS or name in builtin_registry
+
+SHELL_STATE_BUILTINS = ("cd", "exit")
+
+def thread_cpu_times():
+    """(user, sys) CPU seconds used by the calling thread."""
+    import resource
+    if hasattr(resource, "RUSAGE_THREAD"):
+        usage = resource.getrusage(resource.RUSAGE_THREAD)
+        return usage.ru_utime, usage.ru_stime
+    return time.thread_time(), 0.0
+
+class BuiltinChildren:
+    """The processes builtin stages of one pipeline have started and not yet
+    reaped, so the pipeline's deadline and Ctrl-C reach them as well.
+    pgid is the pipeline's process group once it has one."""
+
+    def __init__(self):
+        self.pgid = None
+        self.signalled = None
+        self._procs = set()
+        self._lock = threading.Lock()
 
-        elif command == "pwd":
-            write_to_output(os.getcwd(), safe_stdout)
-            if should_close_stdout: stdout_dest.close()
+    def process_group(self):
+        """The process group a new child should join: the pipeline's while
+        it still exists, otherwise None (the shell's)."""
+        if self.pgid is None:
             return None
-        
-        elif command == "history":
-            history_length = readline.get_current_history_length()
-            start_index = 1
-            if args:
-                try:
-                    n = int(args[0])
-                    start_index = max(1, history_length - n + 1)
-                except ValueError:
-                    pass
-            
-            history_output = []
-            for i in range(start_index, history_length + 1):
-                history_output.append(f"{i}  {readline.get_history_item(i)}")
-            write_to_output("\n".join(history_output), safe_stdout)
-            if should_close_stdout: stdout_dest.close()
+        try:
+            os.killpg(self.pgid, 0)
+        except OSError:
             return None
+        return self.pgid
+
+    def add(self, proc):
+        """Tracks proc; a child started after the pipeline was signalled
+        gets that signal at once."""
+        if getattr(proc, "pid", None) is None:
+            return
+        with self._lock:
+            self._procs.add(proc)
+            sig = self.signalled
+        if sig is not None:
+            _kill_child(proc, sig)
+
+    def discard(self, proc):
+        with self._lock:
+            self._procs.discard(proc)
+
+    def signal(self, sig, signalled_group=None):
+        """Sends sig to every tracked child not in signalled_group, a group
+        that has been sent it already."""
+        with self._lock:
+            self.signalled = sig
+            procs = list(self._procs)
+        for proc in procs:
+            if signalled_group is not None:
+                try:
+                    if os.getpgid(proc.pid) == signalled_group:
+                        continue
+                except OSError:
+                    continue
+            _kill_child(proc, sig)
+
+def _kill_child(proc, sig):
+    if proc.returncode is None:
+        try:
+            os.kill(proc.pid, sig)
+        except ProcessLookupError:
+            pass
 
-        elif command == "cd":
-            if len(parts) > 1:
-                path = os.path.expanduser(parts[1])
+_builtin_stage = threading.local()
+
+def stage_children():
+    """The BuiltinChildren of the pipeline whose builtin stage is running on
+    the calling thread, or None outside a pipeline."""
+    return getattr(_builtin_stage, "children", None)
+
+class BuiltinThread:
+    """Runs a builtin as a pipeline stage on a worker thread.
+
+    The thread owns its own duplicates of the fds it is given and closes
+    them when the builtin returns, so the reader downstream sees EOF exactly
+    when the builtin finishes, just as with a child process. None selects
+    the shell's own stream. children, a BuiltinChildren, is what
+    stage_children() returns on the thread; name labels the builtin's
+    errors."""
+
+    def __init__(self, func, args, stdin_fd, stdout_fd, stderr_fd, children=None, name="seashell"):
+        self.func = func
+        self.args = args
+        self.name = name
+        self.children = children
+        self.returncode = None
+        self._owned = []
+        self.stdin = self._wrap(stdin_fd, "r", sys.stdin)
+        self.stdout = self._wrap(stdout_fd, "w", sys.stdout)
+        self.stderr = self._wrap(stderr_fd, "w", sys.stderr)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _wrap(self, fd, mode, default):
+        if fd is None:
+            return default
+        stream = os.fdopen(os.dup(fd), mode)
+        self._owned.append(stream)
+        return stream
+
+    def _run(self):
+        status = 1
+        cpu_start = thread_cpu_times()
+        _builtin_stage.children = self.children
+        try:
+            status = self.func(self.args, self.stdin, self.stdout, self.stderr)
+        except SystemExit as e:
+            status = e.code if isinstance(e.code, int) else 0
+        except KeyboardInterrupt:
+            status = 130
+        except BrokenPipeError:
+            status = 141
+        except Exception as e:
+            # Reported like an external command's failure, not as a
+            # traceback from a dying thread.
+            self._report(getattr(e, "strerror", None) or e)
+            status = 1
+        finally:
+            for stream in self._owned:
                 try:
-                    os.chdir(path)
-                except FileNotFoundError:
-                    print(f"cd: {parts[1]}: No such file or directory", file=stderr_dest)
+                    stream.close()
+                except BrokenPipeError:
+                    status = 141
+                except OSError:
+                    pass
+            self.cpu_times = tuple(b - a for a, b in zip(cpu_start, thread_cpu_times()))
+            self.end_time = time.perf_counter()
+            self.returncode = status
+
+    def _report(self, message):
+        try:
+            print(f"{self.name}: {message}", file=self.stderr, flush=True)
+        except (OSError, ValueError):
+            pass
+
+    def wait(self, timeout=None):
+        """The builtin's status, or None if it is still running after
+        timeout seconds."""
+        self._thread.join(timeout)
+        return self.returncode
+
+def _here_string_fd(text):
+    """Read end of a pipe holding text plus a newline. What fits in the pipe
+    is written straight away; a thread feeds the rest, so a large here-string
+    cannot block the shell on a full pipe."""
+    data = (text + "\n").encode("utf-8", "surrogateescape")
+    r, w = os.pipe()
+    os.set_blocking(w, False)
+    try:
+        written = os.write(w, data)
+    except BlockingIOError:
+        written = 0
+    if written == len(data):
+        os.close(w)
+        return r
+
+    def feed(rest):
+        try:
+            os.set_blocking(w, True)
+            os.write(w, rest)
+        except BrokenPipeError:
+            pass
+        finally:
+            os.close(w)
+
+    threading.Thread(target=feed, args=(data[written:],), daemon=True).start()
+    return r
+
+def _open_redirect(op, target):
+    if op == "<":
+        flags = os.O_RDONLY
+    elif op == ">>":
+        flags = os.O_WRONLY | os.O_CREAT | os.O_APPEND
+    else:
+        flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC
+    return os.open(target, flags, 0o666)
+
+def apply_redirects(redirects, fds):
+    """Applies redirections, left to right, to fds: a list holding the fds
+    that should end up on 0, 1 and 2. Targets are opened with os.open and
+    nothing is dup2()ed in the shell itself; the final list is handed to the
+    child as spawn file actions. Returns the fds opened here, which the
+    caller closes once the command has started. On failure everything
+    opened so far is closed and the OSError is raised."""
+    opened = []
+    try:
+        for op, target in redirects:
+            base = op.lstrip("0123456789")
+            prefix = op[:len(op) - len(base)]
+            fd = int(prefix) if prefix else (0 if base[0] == "<" else 1)
+            if fd > 2:
+                raise OSError(errno.EBADF, "Bad file descriptor", prefix)
+
+            if base in (">&", "<&"):
+                if target.isdigit():
+                    if int(target) > 2:
+                        raise OSError(errno.EBADF, "Bad file descriptor", target)
+                    fds[fd] = fds[int(target)]
+                    continue
+                if base == "<&" or prefix:
+                    raise OSError(errno.EINVAL, "ambiguous redirect", target)
+                # ">& file" sends both stdout and stderr to the file.
+                new_fd = _open_redirect(">", target)
+                opened.append(new_fd)
+                fds[1] = fds[2] = new_fd
+                continue
+
+            if base == "<<<":
+                new_fd = _here_string_fd(target)
             else:
-                os.chdir(os.path.expanduser("~"))
-            if should_close_stdout: stdout_dest.close()
+                new_fd = _open_redirect(base, target)
+            opened.append(new_fd)
+            fds[fd] = new_fd
+    except OSError:
+        for fd in opened:
+            os.close(fd)
+        raise
+    return opened
+
+def _inline_stream(fd, mode, wrappers):
+    """The text stream an inline builtin uses for fd: the shell's own stream
+    when fd is still the standard one, otherwise an unowned wrapper."""
+    if fd == 0 and mode == "r":
+        return sys.stdin
+    if fd == 1 and mode == "w":
+        return sys.stdout
+    if fd == 2 and mode == "w":
+        return sys.stderr
+    stream = os.fdopen(fd, mode, closefd=False)
+    wrappers.append(stream)
+    return stream
+
+def run_command_segment(parts, input_fd, output_fd, error_fd, redirects=(), process_group=None,
+                        children=None):
+    in_pipeline = isinstance(input_fd, int) or isinstance(output_fd, int)
+    fds = [_as_fd(input_fd), _as_fd(output_fd), _as_fd(error_fd)]
+    for target in range(3):
+        if fds[target] is None:
+            fds[target] = target
+
+    started = shell_stats.start()
+    try:
+        opened = apply_redirects(redirects, fds)
+    except OSError as e:
+        sys.stderr.flush()
+        os.write(fds[2], f"{e.filename}: {e.strerror}\n".encode())
+        return FinishedCommand(1)
+    if redirects:
+        shell_stats.stop("redirect", started)
+
+    try:
+        if not parts:
             return None
+        command = parts[0]
+        args = parts[1:]
+
+        started = shell_stats.start()
+        builtin = builtin_registry.lookup(command, args)
+        if builtin is not None:
+            shell_stats.stop("resolve", started)
+            if in_pipeline and command in SHELL_STATE_BUILTINS:
+                return FinishedCommand(0)
+            sys.stdout.flush()
+            if in_pipeline or getattr(builtin, "spawns", False):
+                shell_stats.count("builtin thread")
+                return BuiltinThread(builtin, args, *fds, children=children, name=command)
+            shell_stats.count("builtin inline")
+            started = shell_stats.start()
+            wrappers = []
+            try:
+                status = builtin(args, _inline_stream(fds[0], "r", wrappers),
+                                 _inline_stream(fds[1], "w", wrappers),
+                                 _inline_stream(fds[2], "w", wrappers))
+            except BrokenPipeError:
+                status = 141
+            except Exception as e:
+                # A failing builtin fails its command, not the shell.
+                sys.stderr.flush()
+                message = getattr(e, "strerror", None) or e
+                os.write(fds[2], f"{command}: {message}\n".encode("utf-8", "surrogateescape"))
+                status = 1
+            finally:
+                for stream in wrappers:
+                    try:
+                        stream.flush()
+                    except OSError:
+                        pass
+                shell_stats.stop("builtin", started)
+            return FinishedCommand(status)
+
+        try:
+            return spawn_command(parts, *fds, process_group=process_group)
+        except OSError as e:
+            if isinstance(e, FileNotFoundError):
+                message = "No such file or directory" if os.sep in command else "command not found"
+                status = 127
+            else:
+                message, status = e.strerror, 126
+            sys.stderr.flush()
+            os.write(fds[2], f"{command}: {message}\n".encode())
+            return FinishedCommand(status)
+    finally:
+        for fd in opened:
+            os.close(fd)
+
+def _reap_stage(proc):
+    if proc.returncode is None:
+        try:
+            _, status, rusage = os.wait4(proc.pid, 0)
+        except ChildProcessError:
+            proc.returncode = 0
         else:
+            proc.returncode = os.waitstatus_to_exitcode(status)
+            proc.rusage = rusage
+    if getattr(proc, "end_time", None) is None:
+        proc.end_time = time.perf_counter()
+
+# Seconds between SIGTERM and SIGKILL for a pipeline past its deadline.
+DEADLINE_GRACE = 2.0
+# How often stages without a pidfd, and stopped stages, are checked for.
+STAGE_POLL_INTERVAL = 0.05
+
+def _signal_stages(children, pgid, sig, builtin_children=None):
+    """Sends sig to the pipeline's process group, or to each running child
+    stage when it has none, and to the children of its builtin stages."""
+    signalled_group = None
+    if pgid is not None:
+        try:
+            os.killpg(pgid, sig)
+            signalled_group = pgid
+        except ProcessLookupError:
+            # Every stage in the group has exited.
+            children = ()
+        except PermissionError:
+            pass
+    if builtin_children is not None:
+        builtin_children.signal(sig, signalled_group)
+    if signalled_group is not None:
+        return
+    for proc in children:
+        if getattr(proc, "pid", None) is not None and proc.returncode is None:
             try:
-                proc = subprocess.Popen(parts, stdin=input_fd, stdout=safe_stdout, stderr=safe_stderr)
-                return proc
-            except FileNotFoundError:
-                print(f"{command}: command not found", file=stderr_dest)
-        
-        if should_close_stdout: stdout_dest.close()
-        if should_close_stderr: stderr_dest.close()
-
-def execute_pipeline(parts):
-    commands = []
-    current_cmd = []
-    for part in parts:
-        if part == "|":
-            if current_cmd:
-                commands.append(current_cmd)
-            current_cmd = []
+                os.kill(proc.pid, sig)
+            except ProcessLookupError:
+                pass
+
+def _try_reap_stage(proc):
+    try:
+        pid, status, rusage = os.wait4(proc.pid, os.WNOHANG)
+    except ChildProcessError:
+        pid, status, rusage = proc.pid, 0, None
+    if not pid:
+        return False
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    proc.rusage = rusage
+    proc.end_time = time.perf_counter()
+    return True
+
+def _resume_stopped(pgid):
+    """Stopping a foreground job needs job control the shell doesn't have,
+    so a stage stopped by Ctrl-Z is continued instead of hanging the wait."""
+    import signal
+    try:
+        stopped = os.waitid(os.P_PGID, pgid, os.WSTOPPED | os.WNOHANG)
+    except (ChildProcessError, AttributeError, OSError):
+        return
+    if stopped is not None:
+        print("\nseashell: stopping jobs is not supported; continuing", file=sys.stderr)
+        os.killpg(pgid, signal.SIGCONT)
+
+def wait_for_stages(children, pgid=None, deadline=None, has_terminal=False, builtin_children=None):
+    """Supervises a pipeline until every stage has finished, recording when
+    each one finished and, for child processes, their rusage.
+
+    Children are reaped in the order they exit (via pidfds, or polled where
+    there are none) so each end time is accurate. Earlier stages are left to
+    finish once the last one has exited: one still writing gets SIGPIPE, as
+    in other shells. Ctrl-C sends SIGINT to the pipeline's process
+    group instead of interrupting the shell. Past deadline (a
+    time.monotonic() value) the group gets SIGTERM, then SIGKILL
+    DEADLINE_GRACE seconds later. Stages stopped by Ctrl-Z are continued,
+    but only while has_terminal says the group holds the terminal: nothing
+    else can stop them. Returns "interrupt", "deadline" or None.
+
+    Builtin stages are supervised too, and the signals reach the processes
+    they start through builtin_children. While one runs, the group leader
+    is left unreaped once it exits, so the group, and the terminal it
+    holds, stays there for the builtin's children to join."""
+    import signal
+    import selectors
+    external = [proc for proc in children
+                if getattr(proc, "pid", None) is not None and proc.returncode is None]
+    threads = [proc for proc in children if isinstance(proc, BuiltinThread)]
+    reason = None
+    kill_at = None
+    polled = []
+    with selectors.DefaultSelector() as selector:
+        for proc in external:
+            try:
+                pidfd = os.pidfd_open(proc.pid)
+            except (AttributeError, OSError):
+                polled.append(proc)
+                continue
+            selector.register(pidfd, selectors.EVENT_READ, proc)
+
+        while selector.get_map() or polled or any(t.returncode is None for t in threads):
+            poll = polled or has_terminal
+            wakeups = [time.monotonic() + STAGE_POLL_INTERVAL] if poll else []
+            if deadline is not None and reason != "deadline":
+                wakeups.append(deadline)
+            if kill_at is not None:
+                wakeups.append(kill_at)
+            timeout = max(0, min(wakeups) - time.monotonic()) if wakeups else None
+            try:
+                if selector.get_map() or polled:
+                    events = selector.select(timeout)
+                else:
+                    # Only builtin stages are left.
+                    events = ()
+                    next(t for t in threads if t.returncode is None).wait(timeout)
+            except KeyboardInterrupt:
+                reason = reason or "interrupt"
+                _signal_stages(children, pgid, signal.SIGINT, builtin_children)
+                continue
+
+            for key, _ in events:
+                selector.unregister(key.fd)
+                os.close(key.fd)
+                proc = key.data
+                if proc.pid == pgid and any(t.returncode is None for t in threads):
+                    proc.end_time = time.perf_counter()
+                else:
+                    _reap_stage(proc)
+            for proc in polled[:]:
+                if _try_reap_stage(proc):
+                    polled.remove(proc)
+            if has_terminal:
+                _resume_stopped(pgid)
+
+            now = time.monotonic()
+            if deadline is not None and reason != "deadline" and now >= deadline:
+                reason = "deadline"
+                _signal_stages(children, pgid, signal.SIGTERM, builtin_children)
+                kill_at = now + DEADLINE_GRACE
+            elif kill_at is not None and now >= kill_at:
+                _signal_stages(children, pgid, signal.SIGKILL, builtin_children)
+                kill_at = None
+
+    for proc in children:
+        if not proc:
+            continue
+        if getattr(proc, "pid", None) is not None:
+            if proc.returncode is None:
+                _reap_stage(proc)
         else:
-            current_cmd.append(part)
-    if current_cmd:
-        commands.append(current_cmd)
- 
-    next_stdin = None 
-    children = []
-    
-    for i, cmd_parts in enumerate(commands):
-        is_last = (i == len(commands) - 1)
-        if is_last:
-            stdout_fd = sys.stdout 
-            next_read_fd = None
+            proc.wait()
+    return reason
+
+def _shell_maxrss():
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def stage_timings(children):
+    """Per-stage timing records for a pipeline whose stages have all been
+    reaped."""
+    # Read after the reaping: a child spawned with vfork/posix_spawn starts
+    # out sharing the shell's memory, and the kernel carries that high-water
+    # mark over exec, so a child's maxrss is never below the shell's own
+    # at the time. A value no larger than that tells us nothing about the
+    # stage.
+    shell_maxrss = _shell_maxrss()
+    records = []
+    for n, proc in enumerate(children, 1):
+        if not proc:
+            continue
+        rusage = getattr(proc, "rusage", None)
+        if rusage is not None:
+            user, system, maxrss = rusage.ru_utime, rusage.ru_stime, rusage.ru_maxrss
+            if maxrss <= shell_maxrss:
+                maxrss = None
         else:
-            r, w = os.pipe()
-            stdout_fd = w
-            next_read_fd = r
-       
-        proc = run_command_segment(cmd_parts, next_stdin, stdout_fd, sys.stderr)
-        
-        if next_stdin is not None and isinstance(next_stdin, int):
-            os.close(next_stdin)
-        if not is_last and proc: 
-            os.close(stdout_fd) 
-            
-        if proc:
+            user, system = getattr(proc, "cpu_times", (0.0, 0.0))
+            maxrss = None
+        records.append({
+            "stage": n,
+            "command": getattr(proc, "command_text", ""),
+            "status": proc.returncode,
+            "real": proc.end_time - proc.start_time,
+            "user": user,
+            "sys": system,
+            "maxrss_kb": maxrss,
+        })
+    return records
+
+def print_timings(records, real, stream, as_json=False):
+    total = {
+        "real": real,
+        "user": sum(r["user"] for r in records),
+        "sys": sum(r["sys"] for r in records),
+        "maxrss_kb": max((r["maxrss_kb"] for r in records if r["maxrss_kb"] is not None), default=None),
+    }
+    if as_json:
+        import json
+        print(json.dumps({"total": total, "stages": records}), file=stream)
+        return
+
+    def row(label, r, command):
+        maxrss = f"{r['maxrss_kb']}KB" if r["maxrss_kb"] is not None else "-"
+        return f"{label:<7}{r['real']:>9.3f}s{r['user']:>9.3f}s{r['sys']:>9.3f}s{maxrss:>12}  {command}"
+
+    print(f"{'stage':<7}{'real':>10}{'user':>10}{'sys':>10}{'maxrss':>12}  command", file=stream)
+    for r in records:
+        print(row(str(r["stage"]), r, r["command"]), file=stream)
+    print(row("total", total, ""), file=stream)
+
+# Largest output, in bytes, a command substitution keeps; the rest is cut
+# off with a warning. 0 means no limit.
+capture_limit = int(os.environ.get("SEASHELL_CAPTURE_LIMIT", "0"))
+CAPTURE_CHUNK = 65536
+
+def _read_fd(fd, limit):
+    """Reads fd to EOF into a bytearray that doubles as it fills, with
+    readinto, so the data is never copied piece by piece. With a limit,
+    stops after that many bytes; returns (data, truncated)."""
+    buf = bytearray(CAPTURE_CHUNK)
+    size = 0
+    truncated = False
+    with open(fd, "rb", buffering=0) as f:
+        while True:
+            if size == len(buf):
+                buf.extend(bytes(len(buf)))
+            want = len(buf) - size
+            if limit:
+                if size >= limit:
+                    truncated = bool(f.read(1))
+                    break
+                want = min(want, limit - size)
+            with memoryview(buf) as view:
+                n = f.readinto(view[size:size + want])
+            if not n:
+                break
+            size += n
+    del buf[size:]
+    return buf, truncated
+
+def capture_output(source, limit=None):
+    """Runs source, a command list, with its stdout on a pipe and returns
+    what it wrote, decoded. The pipe is drained on a thread while the
+    commands run in the usual way, so any amount of output can flow."""
+    import shell_parser
+    if limit is None:
+        limit = capture_limit
+    r, w = os.pipe()
+    result = []
+    reader = threading.Thread(target=lambda: result.append(_read_fd(r, limit)), daemon=True)
+    reader.start()
+    try:
+        run_command_list(shell_parser.parse(source), stdout=w)
+    finally:
+        os.close(w)
+        reader.join()
+    data, truncated = result[0]
+    if truncated:
+        print(f"seashell: command substitution: output cut off at {limit} bytes", file=sys.stderr)
+    return data.decode("utf-8", "surrogateescape")
+
+IFS_WHITESPACE = " \t\n"
+
+# Directory listings for glob expansion, reused while a directory's mtime
+# is unchanged.
+glob_listings = DirListingCache()
+
+def expand_word(word):
+    """The fields a word expands to. Command substitutions run now and lose
+    their trailing newlines; unquoted ones are split on whitespace. A field
+    with an unquoted *, ? or [...] is replaced by the sorted paths it
+    matches, or kept as it is if there are none."""
+    import shell_parser
+    if isinstance(word, str):
+        return [word]
+    import shell_glob
+    fields = []
+    current = []
+    # The field again as a glob pattern: quoted and substituted text is
+    # escaped, so only the unquoted literal parts can match anything.
+    pattern = []
+    globbing = started = False
+
+    def end_field():
+        nonlocal current, pattern, globbing, started
+        text = "".join(current)
+        matches = None
+        if globbing:
+            started_glob = shell_stats.start()
+            matches = shell_glob.glob("".join(pattern), glob_listings)
+            shell_stats.stop("glob", started_glob)
+        fields.extend(matches or [text])
+        current, pattern = [], []
+        globbing = started = False
+
+    for kind, value, quoted in word.parts:
+        if kind == shell_parser.LITERAL:
+            current.append(value)
+            pattern.append(shell_glob.escape(value) if quoted else value)
+            globbing = globbing or not quoted
+            started = started or quoted or bool(value)
+            continue
+        text = capture_output(value).rstrip("\n")
+        if quoted:
+            current.append(text)
+            pattern.append(shell_glob.escape(text))
+            started = True
+            continue
+        if not text:
+            continue
+        if text[0] in IFS_WHITESPACE and started:
+            end_field()
+        for i, field in enumerate(text.split()):
+            if i:
+                end_field()
+            current.append(field)
+            pattern.append(shell_glob.escape(field))
+            started = True
+        if text[-1] in IFS_WHITESPACE and started:
+            end_field()
+    if started:
+        end_field()
+    return fields
+
+def expand_argv(argv):
+    expanded = []
+    for word in argv:
+        expanded += expand_word(word)
+    return expanded
+
+def expand_redirects(redirects):
+    """Redirections with their targets expanded. A target must expand to
+    exactly one word; ValueError otherwise."""
+    import shell_parser
+    expanded = []
+    for op, target in redirects:
+        fields = expand_word(target)
+        if len(fields) != 1:
+            raise ValueError(f"{shell_parser.unparse_word(target)}: ambiguous redirect")
+        expanded.append((op, fields[0]))
+    return expanded
+
+# The terminal foreground pipelines are handed, set by enable_job_control()
+# when the shell runs interactively.
+terminal_fd = None
+# Default deadline in seconds for foreground pipelines (--timeout=SECONDS or
+# SEASHELL_TIMEOUT); None for no limit.
+pipeline_timeout = float(os.environ["SEASHELL_TIMEOUT"]) if os.environ.get("SEASHELL_TIMEOUT") else None
+
+def enable_job_control():
+    """Lets foreground pipelines own the terminal while they run, so Ctrl-C
+    and Ctrl-\\ reach their process group and not the shell."""
+    # _signal rather than signal: this runs before the first prompt, and
+    # signal imports enum.
+    import _signal
+    global terminal_fd
+    try:
+        fd = sys.stdin.fileno()
+        if not os.isatty(fd) or os.tcgetpgrp(fd) != os.getpgrp():
+            return
+    except (OSError, ValueError):
+        return
+    # The shell takes the terminal back from the background, which would
+    # otherwise stop it with SIGTTOU.
+    _signal.signal(_signal.SIGTTOU, _signal.SIG_IGN)
+    terminal_fd = fd
+
+def _give_terminal(pgid):
+    import signal
+    if (terminal_fd is None or threading.current_thread() is not threading.main_thread()):
+        return False
+    try:
+        if os.tcgetpgrp(terminal_fd) != os.getpgrp():
+            return False
+        os.tcsetpgrp(terminal_fd, pgid)
+        # A stage that touched the terminal before it was handed over has
+        # been stopped with SIGTTIN; let it carry on.
+        os.killpg(pgid, signal.SIGCONT)
+    except OSError:
+        return False
+    return True
+
+def _take_terminal():
+    try:
+        os.tcsetpgrp(terminal_fd, os.getpgrp())
+    except OSError:
+        pass
+
+def execute_pipeline(pipeline, background=False, timings=None, stdout=None, timeout=None, stdin=None):
+    """Runs a pipeline. When the shell has job control (enable_job_control
+    found a terminal), its external stages get a process group of their
+    own; otherwise they stay in the shell's, as in other shells, so they
+    can still use the terminal. Background pipelines return their stage
+    handles; foreground ones
+    are supervised by wait_for_stages, bounded by timeout seconds (or the
+    shell's pipeline_timeout), and return the last stage's status. stdin,
+    when given, is the fd the first stage reads instead of the shell's."""
+    import signal
+    import shell_parser
+    if isinstance(pipeline, list):
+        pipeline = shell_parser.pipeline_from_words(pipeline)
+    commands = pipeline.commands
+    if timeout is None:
+        timeout = pipeline_timeout
+    deadline = time.monotonic() + timeout if timeout and not background else None
+
+    # Background jobs must not compete with the prompt for the terminal.
+    if stdin is not None:
+        next_stdin = os.dup(stdin)
+    else:
+        next_stdin = os.open(os.devnull, os.O_RDONLY) if background else None
+    children = []
+    pgid = None
+    # Without job control nobody would give a new group the terminal, and
+    # its stages would stop on SIGTTIN/SIGTTOU as soon as they touched it.
+    own_group = terminal_fd is not None
+    has_terminal = False
+    builtin_children = BuiltinChildren()
+    try:
+        for i, command in enumerate(commands):
+            is_last = (i == len(commands) - 1)
+            if is_last:
+                stdout_fd = sys.stdout if stdout is None else stdout
+                next_read_fd = None
+            else:
+                r, w = os.pipe()
+                stdout_fd = w
+                next_read_fd = r
+
+            command_text = shell_parser.unparse_command(command)
+            start_time = time.perf_counter()
+            cpu_start = thread_cpu_times() if timings is not None else None
+            try:
+                argv = expand_argv(command.argv)
+                redirects = expand_redirects(command.redirects)
+            except ValueError as e:
+                print(f"seashell: {e}", file=sys.stderr)
+                proc = FinishedCommand(1)
+            else:
+                proc = run_command_segment(argv, next_stdin, stdout_fd, sys.stderr, redirects,
+                                           process_group=(0 if pgid is None else pgid) if own_group else None,
+                                           children=builtin_children)
+            if i == 0 and next_stdin is None and isinstance(proc, BuiltinThread):
+                # A builtin stage reading the shell's own stdin. Were the
+                # terminal handed to a group of the later stages, its reads
+                # would fail with EIO, so they stay in the shell's group.
+                own_group = False
+            if proc:
+                proc.start_time = start_time
+                proc.command_text = command_text
+                if isinstance(proc, FinishedCommand):
+                    # Ran inline on this thread.
+                    proc.end_time = time.perf_counter()
+                    if cpu_start is not None:
+                        proc.cpu_times = tuple(b - a for a, b in zip(cpu_start, thread_cpu_times()))
+                elif own_group and pgid is None and getattr(proc, "pid", None) is not None:
+                    # The first child leads the group the others join.
+                    pgid = builtin_children.pgid = proc.pid
+                    if not background:
+                        has_terminal = _give_terminal(pgid)
+
+            # Every stage holds its own copies of the pipe ends it uses (child
+            # processes inherit them, builtin threads dup them), so the shell's
+            # copies can always be closed right away.
+            if next_stdin is not None:
+                os.close(next_stdin)
+            if not is_last:
+                os.close(stdout_fd)
+
             children.append(proc)
-        
-        next_stdin = next_read_fd
+            next_stdin = next_read_fd
 
-    for proc in children:
-        proc.wait()
+        if background:
+            return [proc for proc in children if proc]
+
+        started = shell_stats.start()
+        reason = wait_for_stages(children, pgid, deadline, has_terminal, builtin_children)
+        shell_stats.stop("wait", started)
+        shell_stats.count("pipelines")
+    finally:
+        if has_terminal:
+            _take_terminal()
+
+    if timings is not None:
+        timings.extend(stage_timings(children))
+    if reason == "deadline":
+        print(f"seashell: deadline of {timeout:g}s exceeded: {shell_parser.unparse_pipeline(pipeline)}",
+              file=sys.stderr)
+        return 124
+    # The pipeline's status is that of its last stage; a stage killed by
+    # signal N counts as 128 + N.
+    last_proc = children[-1] if children else None
+    status = last_proc.wait() if last_proc else 0
+    if reason == "interrupt" or status == -signal.SIGINT or builtin_children.signalled == signal.SIGINT:
+        # As in other shells, Ctrl-C abandons the rest of the command line.
+        raise KeyboardInterrupt
+    return 128 - status if status < 0 else status
+
+def run_line(line):
+    import shell_parser
+    started = shell_stats.start()
+    try:
+        command_list = shell_parser.parse(line)
+    except shell_parser.ParseError as e:
+        print(f"seashell: {e}", file=sys.stderr)
+        return 2
+    shell_stats.stop("parse", started)
+    try:
+        return run_command_list(command_list)
+    finally:
+        shell_stats.stop("line", started)
+
+def run_command_list(command_list, stdout=None):
+    """Runs each item of a CommandList. stdout, when given, is the fd the
+    output goes to instead of the shell's; items ending in & then run in
+    the foreground, since their output is wanted too."""
+    status = 0
+    for and_or, background in command_list.items:
+        if background and stdout is None:
+            status = run_in_background(and_or)
+        else:
+            status = run_and_or(and_or, stdout)
+    return status
+
+def run_and_or(and_or, stdout=None, stdin=None):
+    status = run_pipeline(and_or.pipelines[0], stdout, stdin=stdin)
+    for operator, pipeline in zip(and_or.operators, and_or.pipelines[1:]):
+        if (operator == "&&") == (status == 0):
+            status = run_pipeline(pipeline, stdout, stdin=stdin)
+    return status
+
+def run_pipeline(pipeline, stdout=None, timeout=None, stdin=None):
+    keyword = pipeline.commands[0].argv[:1]
+    if keyword == ("time",):
+        return run_timed(pipeline, stdout, timeout, stdin)
+    if keyword == ("deadline",):
+        return run_with_deadline(pipeline, stdout, stdin)
+    return execute_pipeline(pipeline, stdout=stdout, timeout=timeout, stdin=stdin)
+
+def parse_timeout(text):
+    try:
+        seconds = float(text)
+    except (TypeError, ValueError):
+        seconds = 0
+    if not seconds > 0:
+        raise ValueError(f"{text}: invalid number of seconds")
+    return seconds
+
+DEADLINE_USAGE = "usage: deadline SECONDS command [| command...]"
+
+def _split_deadline(pipeline):
+    """(pipeline, seconds) for a pipeline starting with deadline SECONDS;
+    ValueError if it is malformed."""
+    first = pipeline.commands[0]
+    if len(first.argv) < 3 and len(pipeline.commands) == 1:
+        raise ValueError(DEADLINE_USAGE)
+    seconds = parse_timeout(first.argv[1] if len(first.argv) > 1 else "")
+    return pipeline._replace(commands=(first._replace(argv=first.argv[2:]),) + pipeline.commands[1:]), seconds
+
+def run_with_deadline(pipeline, stdout=None, stdin=None):
+    """deadline SECONDS pipeline: stops the whole pipeline once it has run
+    for SECONDS, with status 124."""
+    try:
+        pipeline, seconds = _split_deadline(pipeline)
+    except ValueError as e:
+        print(f"deadline: {e}", file=sys.stderr)
+        return 2
+    return run_pipeline(pipeline, stdout, seconds, stdin)
+
+def run_in_background(and_or):
+    import shell_parser
+    text = shell_parser.unparse_and_or(and_or) + " &"
+    if and_or.operators:
+        # A && / || chain has to make decisions as it goes, so it runs on a
+        # thread of its own instead of as a plain set of processes, reading
+        # /dev/null like any other background job.
+        devnull = os.open(os.devnull, os.O_RDONLY)
+        try:
+            procs = [BuiltinThread(lambda args, stdin, stdout, stderr: run_and_or(and_or, stdin=stdin.fileno()),
+                                   [], devnull, None, None)]
+        finally:
+            os.close(devnull)
+    else:
+        procs = execute_pipeline(and_or.pipelines[0], background=True)
+    job = jobs.add(text, procs)
+    pid = getattr(procs[-1], "pid", None) if procs else None
+    print(f"[{job.job_id}] {pid if pid is not None else ''}".rstrip(), file=sys.stderr)
+    return 0
+
+def run_timed(pipeline, stdout=None, timeout=None, stdin=None):
+    first = pipeline.commands[0]
+    argv = first.argv[1:]
+    as_json = False
+    while argv and argv[0] in ("--json", "-p"):
+        as_json = as_json or argv[0] == "--json"
+        argv = argv[1:]
+    if not argv and len(pipeline.commands) == 1:
+        return 0
+    pipeline = pipeline._replace(commands=(first._replace(argv=argv),) + pipeline.commands[1:])
+    if argv[:1] == ("deadline",):
+        try:
+            pipeline, timeout = _split_deadline(pipeline)
+        except ValueError as e:
+            print(f"deadline: {e}", file=sys.stderr)
+            return 2
+
+    records = []
+    start = time.perf_counter()
+    status = execute_pipeline(pipeline, timings=records, stdout=stdout, timeout=timeout, stdin=stdin)
+    print_timings(records, time.perf_counter() - start, sys.stderr, as_json)
+    return status
+
+def read_continuation(command_input, prompt="> "):
+    """command_input plus as many further lines, read with prompt, as it
+    takes to complete it; None if the user gives up with Ctrl-C, Ctrl-D
+    ends it as is."""
+    import shell_parser
+    while True:
+        try:
+            shell_parser.parse(command_input)
+        except shell_parser.IncompleteInput:
+            pass
+        except shell_parser.ParseError:
+            return command_input  # run_line reports it
+        else:
+            return command_input
+        try:
+            command_input += "\n" + input(prompt)
+        except EOFError:
+            print()
+            return command_input
+        except KeyboardInterrupt:
+            print()
+            return None
+
+
+def run_lines(lines):
+    """Runs lines as a script. A command that is incomplete at the end of a
+    line (an open quote or $(, a trailing \\, |, && or ||) continues on the
+    next one, and runs once the parser has all of it."""
+    import shell_parser
+    status = 0
+    pending = ""
+    for line in lines:
+        pending += line if line.endswith("\n") else line + "\n"
+        try:
+            shell_parser.parse(pending)
+        except shell_parser.IncompleteInput:
+            continue
+        except shell_parser.ParseError:
+            pass  # run_line reports it
+        status = run_line(pending)
+        pending = ""
+    if pending:
+        # Still incomplete at the end of the input: report why.
+        status = run_line(pending)
+    sys.stdout.flush()
+    return status
+
+# Interactive start-up. --fast-start (or SEASHELL_FAST_START=1) skips the
+# banner and builds the command Trie on the first command-name TAB instead
+# of right away; --no-banner only skips the banner.
+fast_start = bool(os.environ.get("SEASHELL_FAST_START"))
+show_banner = not fast_start
+
+def apply_shell_options(options):
+    global fast_start, show_banner, pipeline_timeout
+    for option in options:
+        name, _, value = option.partition("=")
+        if name == "--spawn":
+            set_spawn_backend(value)
+        elif name == "--timeout":
+            pipeline_timeout = parse_timeout(value)
+        elif option == "--no-banner":
+            show_banner = False
+        elif option == "--fast-start":
+            fast_start = True
+            show_banner = False
+        else:
+            raise ValueError(f"{option}: invalid option")
+
+def parse_shell_args(argv):
+    """Returns (mode, value, rest) for the command line: ("command", text) for
+    -c, ("stdin", None) for -s or piped stdin, ("script", path) for a file, and
+    ("interactive", None) otherwise. Unrecognised options are left in rest."""
+    rest = []
+    i = 0
+    while i < len(argv):
+        arg = argv[i]
+        if arg == "-c":
+            if i + 1 >= len(argv):
+                raise ValueError("-c: option requires an argument")
+            return "command", argv[i + 1], rest
+        if arg == "-s":
+            return "stdin", None, rest
+        if arg.startswith("-") and arg != "-":
+            rest.append(arg)
+        else:
+            if arg == "-":
+                return "stdin", None, rest
+            return "script", arg, rest
+        i += 1
+    if not sys.stdin.isatty():
+        return "stdin", None, rest
+    return "interactive", None, rest
+
+def run_noninteractive(mode, value):
+    try:
+        if mode == "command":
+            return run_lines(value.splitlines())
+        if mode == "stdin":
+            return run_lines(sys.stdin)
+        try:
+            with open(value) as script:
+                return run_lines(script)
+        except OSError as e:
+            print(f"{value}: {e.strerror}", file=sys.stderr)
+            return 127
+    except KeyboardInterrupt:
+        return 130
 
 def print_banner():
     banner = r"""
@@ -311,6 +2357,7 @@ def print_banner():
         "Resting Beach Face (Standard Output)."
     ]
     print(banner)
+    import random
     print(f"   {random.choice(puns)}")
     print("   Type 'exit' to wave goodbye.\n")
     print("--------------------------------------------------\n")
\ No newline at end of file
@@ -0,0 +1,178 @@
+import os
+import sys
+import select
+import struct
+import threading
+import shell_utils as utils
+
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE
+              | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+EVENT_HEADER = struct.Struct("iIII")
+
+
+def _load_inotify():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        import ctypes
+        import ctypes.util
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+class PathWatcher:
+    """Keeps a ShellCompleter's command Trie in step with the PATH directories.
+
+    Uses inotify (through ctypes) on Linux and falls back to polling each
+    directory's mtime elsewhere or when inotify is unavailable. Only the
+    names that appeared or disappeared are inserted into or removed from
+    the Trie."""
+
+    def __init__(self, completer, path_dirs=None, poll_interval=2.0):
+        self.completer = completer
+        if path_dirs is None:
+            path_dirs = os.environ.get("PATH", "").split(os.pathsep)
+        self.path_dirs = list(dict.fromkeys(p for p in path_dirs if p))
+        self.poll_interval = poll_interval
+        self.backend = None
+        self._known = {}
+        self._mtimes = {}
+        self._stop_r, self._stop_w = os.pipe()
+        self._thread = None
+
+    def start(self, use_inotify=True):
+        libc = _load_inotify() if use_inotify else None
+        inotify_fd = -1
+        if libc is not None:
+            inotify_fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if inotify_fd >= 0:
+            self.backend = "inotify"
+            target = lambda: self._run_inotify(libc, inotify_fd)
+        else:
+            self.backend = "poll"
+            target = self._run_poll
+        self._thread = threading.Thread(target=target, name="path-watcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is None:
+            return
+        os.write(self._stop_w, b"x")
+        self._thread.join()
+        self._thread = None
+        os.close(self._stop_r)
+        os.close(self._stop_w)
+
+    def _snapshot(self, path_dir):
+        try:
+            self._mtimes[path_dir] = os.stat(path_dir).st_mtime_ns
+            self._known[path_dir] = set(utils.scan_path_dir(path_dir))
+        except OSError:
+            self._mtimes.pop(path_dir, None)
+            self._known[path_dir] = set()
+
+    def _rescan(self, path_dir):
+        before = self._known.get(path_dir, set())
+        self._snapshot(path_dir)
+        after = self._known[path_dir]
+        for name in after - before:
+            self.completer.add_command(name)
+        for name in before - after:
+            self.completer.remove_command(name, path_dir)
+
+    def _check(self, path_dir, name):
+        known = self._known.setdefault(path_dir, set())
+        full = os.path.join(path_dir, name)
+        if os.path.isfile(full) and os.access(full, os.X_OK):
+            if name not in known:
+                known.add(name)
+                self.completer.add_command(name)
+        elif name in known:
+            known.discard(name)
+            self.completer.remove_command(name, path_dir)
+
+    def _run_inotify(self, libc, inotify_fd):
+        self.completer.wait_until_ready()
+        watches = {}
+        for path_dir in self.path_dirs:
+            wd = libc.inotify_add_watch(inotify_fd, os.fsencode(path_dir), WATCH_MASK)
+            if wd >= 0:
+                watches[wd] = path_dir
+            self._snapshot(path_dir)
+
+        try:
+            while True:
+                ready, _, _ = select.select([inotify_fd, self._stop_r], [], [])
+                if self._stop_r in ready:
+                    return
+                try:
+                    data = os.read(inotify_fd, 65536)
+                except BlockingIOError:
+                    continue
+
+                changed = {}
+                offset = 0
+                while offset < len(data):
+                    wd, mask, _cookie, length = EVENT_HEADER.unpack_from(data, offset)
+                    offset += EVENT_HEADER.size
+                    name = data[offset:offset + length].rstrip(b"\0")
+                    offset += length
+
+                    if mask & IN_Q_OVERFLOW:
+                        for path_dir in self.path_dirs:
+                            changed[path_dir] = None
+                        continue
+                    path_dir = watches.get(wd)
+                    if path_dir is None:
+                        continue
+                    if mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                        watches.pop(wd, None)
+                        changed[path_dir] = None
+                    elif name and changed.get(path_dir, set()) is not None:
+                        changed.setdefault(path_dir, set()).add(os.fsdecode(name))
+
+                for path_dir, names in changed.items():
+                    if names is None:
+                        self._rescan(path_dir)
+                    else:
+                        for name in names:
+                            self._check(path_dir, name)
+        finally:
+            os.close(inotify_fd)
+
+    def _run_poll(self):
+        self.completer.wait_until_ready()
+        for path_dir in self.path_dirs:
+            self._snapshot(path_dir)
+
+        while True:
+            ready, _, _ = select.select([self._stop_r], [], [], self.poll_interval)
+            if ready:
+                return
+            for path_dir in self.path_dirs:
+                try:
+                    mtime = os.stat(path_dir).st_mtime_ns
+                except OSError:
+                    mtime = None
+                if mtime != self._mtimes.get(path_dir):
+                    self._rescan(path_dir)
@@ -0,0 +1,54 @@
+import os
+
+import pytest
+
+import shell_glob
+
+
+@pytest.fixture
+def tree(tmp_path, monkeypatch):
+    """A small tree under tmp_path, which is also the cwd."""
+    for path in ("a.py", "b.py", "c.txt", ".dot.py", "lit*x", "litax",
+                 "src/x.py", "src/pkg/y.py", "src/pkg/sub/z.py", ".hidden/h.py"):
+        path = tmp_path / path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.touch()
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def test_star_and_question_mark(tree):
+    assert shell_glob.glob("*.py") == ["a.py", "b.py"]
+    assert shell_glob.glob("?.txt") == ["c.txt"]
+
+
+def test_leading_dot_needs_matching_explicitly(tree):
+    assert ".dot.py" not in shell_glob.glob("*")
+    assert shell_glob.glob(".*") == [".dot.py", ".hidden"]
+
+
+def test_brackets(tree):
+    assert shell_glob.glob("[ab].py") == ["a.py", "b.py"]
+    assert shell_glob.glob("[!a]*.py") == ["b.py"]
+    assert shell_glob.glob("[^a]*.py") == ["b.py"]
+
+
+def test_double_star_skips_hidden_directories(tree):
+    assert shell_glob.glob("**/*.py") == ["a.py", "b.py", "src/pkg/sub/z.py", "src/pkg/y.py", "src/x.py"]
+    assert shell_glob.glob("src/**/z.py") == ["src/pkg/sub/z.py"]
+
+
+def test_absolute_pattern(tree):
+    assert shell_glob.glob(os.path.join(str(tree), "src", "*.py")) == [os.path.join(str(tree), "src", "x.py")]
+
+
+def test_escapes(tree):
+    assert not shell_glob.has_magic("lit\\*x")
+    assert shell_glob.glob("lit\\*[x]") == ["lit*x"]
+    assert shell_glob.glob("lit?x") == ["lit*x", "litax"]
+    assert shell_glob.glob(shell_glob.escape("lit*") + "?") == ["lit*x"]
+
+
+def test_no_match_and_no_magic(tree):
+    assert shell_glob.glob("*.rs") == []
+    assert shell_glob.glob("a.py") == []
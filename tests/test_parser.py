@@ -0,0 +1,56 @@
+import pytest
+
+import shell_parser
+from shell_parser import AndOr, Command, CommandList, Pipeline, Word, OP, WORD, LITERAL, SUBST
+
+
+def commands(line):
+    """The Commands of line's first pipeline."""
+    return shell_parser.parse(line).items[0][0].pipelines[0].commands
+
+
+def test_tokenize_words_and_operators():
+    assert shell_parser.tokenize("echo a 2>&1 | grep x") == [
+        (WORD, "echo"), (WORD, "a"), (OP, "2>&"), (WORD, "1"),
+        (OP, "|"), (WORD, "grep"), (WORD, "x"),
+    ]
+
+
+def test_quotes_and_escapes_join_into_one_word():
+    (command,) = commands("echo 'a $b' \"c d\" e\\ f 'g*'")
+    assert command.argv == ("echo", "a $b", "c d", "e f", "g*")
+
+
+def test_redirects():
+    (command,) = commands("cmd > out 2>>err 2>&1 < in")
+    assert command.argv == ("cmd",)
+    assert command.redirects == ((">", "out"), ("2>>", "err"), ("2>&", "1"), ("<", "in"))
+
+
+def test_lists_and_and_or():
+    assert shell_parser.parse("a; b & c || d") == CommandList((
+        (AndOr((Pipeline((Command(("a",), ()),)),), ()), False),
+        (AndOr((Pipeline((Command(("b",), ()),)),), ()), True),
+        (AndOr((Pipeline((Command(("c",), ()),)), Pipeline((Command(("d",), ()),))), ("||",)), False),
+    ))
+
+
+def test_command_substitution():
+    (command,) = commands("echo $(ls) `pwd` \"x$(date)y\"")
+    assert command.argv[1:] == (
+        Word(((SUBST, "ls", False),)),
+        Word(((SUBST, "pwd", False),)),
+        Word(((LITERAL, "x", True), (SUBST, "date", True), (LITERAL, "y", True))),
+    )
+
+
+@pytest.mark.parametrize("line", ['echo "a', "echo 'a", "echo $(ls", "echo `ls", "echo a \\", "echo a |", "echo a &&"])
+def test_incomplete_input(line):
+    with pytest.raises(shell_parser.IncompleteInput):
+        shell_parser.parse(line)
+
+
+def test_syntax_error_is_not_incomplete():
+    with pytest.raises(shell_parser.ParseError) as info:
+        shell_parser.parse("echo a | | b")
+    assert not isinstance(info.value, shell_parser.IncompleteInput)